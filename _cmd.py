@@ -21,245 +21,47 @@
 # THE SOFTWARE.
 
 
-from dragonfly import (Grammar, AppContext, MappingRule, Dictation, Key, Text,
-                       Integer, CompoundRule, Choice, RuleRef, Alternative,
-                       Repetition, Playback)
+from dragonfly import AppContext
+
+from lib import definitions, hotreload, paste, usage
+from lib.chaining import ContinuousCommandRule
+from lib.execution import CancelRule
+from lib.history import RepeatRule
+from lib.identifiers import Identifiers
+from lib.lazy import LazyGrammar
+from lib.macros import MacroRule
+from lib.spelling import SpellRule
+from lib.vocabulary import split_rules
 
 context = AppContext(title="command prompt")
-grammar = Grammar("command prompt", context=context)
 
-rules = MappingRule(
-    name = "emacs",
-    mapping = {
-        # general commands for buffers, windows, etc.
-        "run python": Text("python") + Key("enter"),
-        "quit python": Key("c-c"),
+# legacy cmd.exe consoles do not paste with c-v: type long texts too
+paste.configure("command prompt", threshold=None)
 
-        # programming constructs
-        "new class": Text("class ():") + Key("left, left, left"),
-        "new function": Text("def ():") + Key("left, left, left"),
-        "new conditional": Text("if :") + Key("left"),
-        "new while loop": Text("while :") + Key("left"),
-        "new for loop": Text("for  in :") + Key("left, left, left, left, left"),
-        "print statement": Text("print()") + Key("left"),
-        "pass":  Text("pass"),
-        "self": Text("self."),
-        "for loop": Text("for"),
-        "new dictionary": Text("dict()"),
-        "find coordinates": Text("coords()"),
-        "define in it": Text("__init__"),
-        "append": Text(".append()") + Key("escape, i"),
-        "jason": Text("json"),
+mapping = definitions.load("cmd")
+# commands rarely used here go in a rule of their own, which "rare commands
+#  off" switches off (see lib.usage)
+rules, rare_rules = split_rules("cmd", mapping,
+                                usage.rare_specs("command prompt", mapping))
 
-        # movements
-        "to last": Key("end"),
-        "to start": Key("home"),
-        "to top": Key("c-home"),
-        "to bottom": Key("c-end"),
-        "jump": Key("c-right"),
-        # SPELLING AND SYMBOL
-        # lowercase letters
-        "alpha": Text("a"),
-        "bravo": Text("b"),
-        "charlie": Text("c"),
-        "delta": Text("d"),
-        "echo": Text("e"),
-        "fox": Text("f"),
-        "golf": Text("g"),
-        "hotel": Text("h"),
-        "indie": Text("i"),
-        "juliet": Text("j"),
-        "kick": Text("k"),
-        "lame": Text("l"),
-        "mike": Text("m"),
-        "november": Text("n"),
-        "oscar": Text("o"),
-        "pancake": Text("p"),
-        "quebec": Text("q"),
-        "romeo": Text("r"),
-        "sierra": Text("s"),
-        "tango": Text("t"),
-        "uniform": Text("u"),
-        "victor": Text("v"),
-        "whiskey": Text("w"),
-        "x-ray": Text("x"),
-        "yep": Text("y"),
-        "zappy": Text("z"),
-        # uppercase letters
-        "bic alpha": Text("A"),
-        "bic bravo": Text("B"),
-        "bic charlie": Text("C"),
-        "bic delta": Text("D"),
-        "bic echo": Text("E"),
-        "bic fox": Text("F"),
-        "bic golf": Text("G"),
-        "bic hotel": Text("H"),
-        "bic indie": Text("I"),
-        "bic juliet": Text("J"),
-        "bic kick": Text("K"),
-        "bic lame": Text("L"),
-        "bic mike": Text("M"),
-        "bic november": Text("N"),
-        "bic oscar": Text("O"),
-        "bic pancake": Text("P"),
-        "bic quebec": Text("Q"),
-        "bic romeo": Text("R"),
-        "bic sierra": Text("S"),
-        "bic tango": Text("T"),
-        "bic uniform": Text("U"),
-        "bic victor": Text("V"),
-        "bic whiskey": Text("W"),
-        "bic x-ray": Text("X"),
-        "bic yep": Text("Y"),
-        "bic zappy": Text("Z"),
 
-        # numbers
-        "zero":  Text("0"),
-        "one": Text("1"),
-        "two": Text("2"),
-        "three": Text("3"),
-        "four": Text("4"),
-        "five": Text("5"),
-        "six": Text("6"),
-        "seven": Text("7"),
-        "eight": Text("8"),
-        "nine": Text("9"),
+def build_rules():
+    result = [Identifiers(), SpellRule(), ContinuousCommandRule(rules),
+              CancelRule(), RepeatRule(), MacroRule("command prompt")]
+    if rare_rules.element is not None:
+        rare = ContinuousCommandRule(rare_rules, name="continuous rare")
+        result += [rare, usage.RareCommandsRule("command prompt", rare)]
+    return result
 
-        # symbols
-        "semi": Text(";"),
-        "commie": Key("comma"),
-        "corn": Key("colon"),
-        "left single": Key("squote"),
-        "left double": Key("dquote"),
-        "left paren": Key("lparen"),
-        "right paren": Key("rparen"),
-        "left brace": Key("lbrace"),
-        "right brace": Key("rbrace"),
-        "left bracket": Key("lbracket"),
-        "right bracket": Key("rbracket"),
-        "spa": Key("space"),
-        "plus": Key("space, plus, space"),
-        "minus": Key("space, minus, space"),
-        "equals": Key("space, equal, space"),
-        "is equals to": Key("equal"),
-        "Ash": Key("hyphen"),
-        "times [<text>]": Text("* ") + Text("%(text)s"),
-        "braces": Key("lbrace, rbrace") + Key("left"),
-        "brackets": Key("lbracket, rbracket") + Key("left"),
-        "parens": Key("lparen, rparen") + Key("left"),
-        "angles": Key("langle, rangle") + Key("left"),
-        "doubles": Key("dquote, dquote") + Key("left"),
-        "singles": Key("squote, squote") + Key("left"),
-        "exclamation": Key("exclamation"),
-        "greater than": Text(" => "),
-        "double equals": Text(" == "),
-        "not equals": Text(" != "),
-        "pound": Text("#"),
-        "dot": Text("."),
 
-        # editing
-        "indent": Key("tab"),
-        "indent out": Key("s-tab"),
-        "copy": Key("c-c"),
-        "cut": Key("c-x"),
-        "paste": Key("c-v"),
-        "undo": Key("c-z"),
-        "again": Key("c-y"),
-
-        #specific the terminal
-        "change directory": Text("cd "),
-        "previous command": Key("up"),
-
-        #specific to project
-        "go to intervention project": Text(
-            "cd C:\\Users\\MarioE\\Box Sync\\Proyectos\\interv_lectura\\Intervencion"
-        ),
-        "run intervention": Text("python interface.py") + Key("enter"),
-
-        # git
-        "get status": Text("git status") + Key('enter'),
-        "get push": Text("git push") + Key('enter'),
-        #"push to production": Text("git push all master") + Key('enter'),
-        "get add all": Text("git add -A") + Key('enter'),
-        "get commit": Text("git commit -m "),
-        "get clone": Text("git clone "),
-        #"check out": Text("git checkout ") + Key("tab"),
-        "get fetch": Text("git fetch ") + Key("tab"),
-        "get merge": Text("git merge ") + Key("tab"),
-        "get difference": Text("git diff"),
-        #"stash": Text("git stash save") + Key('enter'),
-        #"pop stash": Text("git stash pop") + Key('enter'),
-    },
-
-    extras = [
-        Dictation("text", format=False),
-        Dictation("mark", format=False),
-        Integer("n", 1, 20000),
-        Integer("scroll_by", 1, 20000),
-      ],
-    defaults = {
-      "text" : "",
-      "mark": "a",
-      "n" : 1,
-      "scroll_by" : 1
-      }
-    )
-
-
-class Identifiers(CompoundRule):
-    """The class identifiers was taken from Cesar Crusius' repository
-    (https://github.com/ccrusius/dragonfly-modules).
-    The specs determine the properties of the words.
-
-    The options are the following:
-    If the first spec is true then all the letters are uppercase.
-
-    If the second spec is true then the first words will be cap.
-
-    If the third spec is true then the first letter of each word will be cap,
-    except for the first word.
-
-    If the fourth spec is true then the separator specified will be
-    used to join the words.
-    """
-
-    spec = "<naming> <text>"
-    extras = [
-        Choice("naming", {
-            "constant": [True, False, False, "_"],
-            "variable": [False, False, True, ""],
-            "snake": [False, False, False, "_"],
-            "class": [False, True, True, ""],
-            "fragment": [False, False, False, " "],
-            "sentence": [False, True, False, " "],
-            "file path": [False, False, False, "\\"],
-            "dot notation": [False, False, False, "."]
-        }),
-        Dictation("text")
-    ]
-
-
-    def _process_recognition(self, node, extras):
-        spec = extras["naming"]
-        text = extras["text"].format()
-        text = text.upper() if spec[0] else text.lower()
-        words = text.split(" ")
-        if len(words) == 0:
-            return
-        if spec[1]:
-            words[0] = words[0].capitalize()
-        if spec[2]:
-            words = [words[0]] + [w.capitalize() for w in words[1:]]
-        Text(spec[3].join(words)).execute()
-
-
-grammar.add_rule(Identifiers())
-grammar.add_rule(rules)
-grammar.load()
+grammar = LazyGrammar("command prompt", context, build_rules)
+hotreload.reloader().watch("cmd", [rules, rare_rules], grammar)
 
 
 def unload():
     global grammar
     if grammar:
-        grammar.unload()
+        hotreload.reloader().unwatch("cmd")
+        usage.flush()
+        grammar.close()
     grammar = None
@@ -1,24 +1,39 @@
-from dragonfly import (Grammar, CompoundRule, Config, Section, Item)
+from dragonfly import (CompoundRule, Config, Section, Item)
 
-import natlink
+from lib import timing, trace
+from lib.sleep import SleepGrammar, sleeper
 
 config = Config("snore");
 config.lang = Section("Language section");
 config.lang.snore = Item("snore", doc="Put the microphone to sleep")
+config.lang.wake = Item("wake up", doc="Wake the microphone up")
 
+@timing.instrument
 class SnoreRule(CompoundRule):
 
   spec = config.lang.snore
-  
+
+  def _process_recognition(self, node, extras):
+    sleeper().sleep(self.grammar)
+    trace.record(self.grammar.name, self.name, self.spec, "", "")
+
+@timing.instrument
+class WakeRule(CompoundRule):
+
+  spec = config.lang.wake
+
   def _process_recognition(self, node, extras):
-    self._log.debug("sleepy mic")
-    natlink.setMicState("sleeping")
+    sleeper().wake()
+    trace.record(self.grammar.name, self.name, self.spec, "", "")
 
-grammar = Grammar("snore")
+grammar = SleepGrammar("snore")
 grammar.add_rule(SnoreRule())
+grammar.add_rule(WakeRule())
 grammar.load()
 
 def unload():
   global grammar
-  if grammar: grammar.unload()
+  if grammar:
+    sleeper().wake()
+    grammar.unload()
   grammar = None
@@ -0,0 +1,4 @@
+"""Offline benchmarks for the grammars in this directory.
+
+Run them from the macro directory, e.g. ``python -m benchmarks.actions``.
+"""
@@ -0,0 +1,105 @@
+"""Per-recognition cost of emacs commands, with and without cached events.
+
+Loads emacs.py on the offline engine of benchmarks.stub and mimics a few
+representative commands, the way Dragon hands them to the grammar: the
+chain rule binds the mapping actions, batches them and sends the events
+to the KeyboardSink. Each command is timed twice, from the recognition
+until its events are sent, and for the execution of its batch alone
+(building or fetching the events and sending them, see lib.timing):
+
+ - uncached: the keyboard event caches of the mapping actions (see
+   lib.keystrokes) are emptied before every recognition, so every spec
+   is interpolated and parsed again,
+ - cached: the same recognition repeated, reusing the cached events.
+
+"parsed" is the number of Key and Text actions converted to keyboard
+events per cached recognition. Usage::
+
+    python -m benchmarks.actions [repeat]
+"""
+
+import sys
+
+from benchmarks import stub
+from lib import keystrokes, timing
+from lib.execution import action_queue
+
+
+commands = [
+    "kill two line",
+    "kill line before three",
+    "jump four",
+    "open in all projects",
+    "run file",
+    "kill two word jump three",
+    "insert doc string",
+]
+
+
+def clear_caches(rules):
+    """Empty the event caches of the actions of the CommandRules
+    *rules*."""
+    actions = [action for rule in rules
+               for action in rule._mapping.values()]
+    actions.extend(keystrokes._stripped.values())
+    for action in actions:
+        if isinstance(action, keystrokes.Keystrokes):
+            action._cache.clear()
+
+
+def per_recognition(engine, words, repeat, before=None):
+    """Return the mean times to recognize *words* and send its events and
+    to execute its batch, calling *before* ahead of each recognition."""
+    timing.reset()
+    total = 0
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        start = timing.clock()
+        engine.mimic(words, **stub.window("emacs"))
+        action_queue().wait()
+        total += timing.clock() - start
+    executions = [entry for entry in timing.report()
+                  if entry["phase"] == "execute"]
+    return (total / repeat,
+            sum(entry["mean"] * entry["count"] for entry in executions)
+            / repeat)
+
+
+def main(argv):
+    repeat = int(argv[1]) if len(argv) > 1 else 200
+    engine, _ = stub.install()
+    emacs = stub.load_module("emacs")
+    rules = (list(emacs.mode_rules.values())
+             + list(emacs.rare_rules.values()))
+
+    parsed = [0]
+    keyboard_events = keystrokes._keyboard_events
+
+    def counting_keyboard_events(*args):
+        parsed[0] += 1
+        return keyboard_events(*args)
+
+    print("%-26s %21s %21s" % ("", "uncached (us)", "cached (us)"))
+    print("%-26s %10s %10s %10s %10s %8s %7s" % (
+        "command", "total", "execute", "total", "execute", "speedup",
+        "parsed"))
+    for words in commands:
+        # Every command starts in normal mode, as in the corpus.
+        emacs.tracker.set("normal")
+        uncached = per_recognition(engine, words, repeat,
+                                   lambda: (clear_caches(rules),
+                                            emacs.tracker.set("normal")))
+        keystrokes._keyboard_events = counting_keyboard_events
+        parsed[0] = 0
+        cached = per_recognition(engine, words, repeat,
+                                 lambda: emacs.tracker.set("normal"))
+        keystrokes._keyboard_events = keyboard_events
+        print("%-26s %10.1f %10.1f %10.1f %10.1f %7.1fx %7.1f" % (
+            words, uncached[0] * 1e6, uncached[1] * 1e6, cached[0] * 1e6,
+            cached[1] * 1e6, uncached[1] / cached[1],
+            parsed[0] / float(repeat)))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,372 @@
+"""Phrases of co-active grammars that sound alike, ranked by risk.
+
+Loads every grammar module on the offline engine of benchmarks.stub and,
+for each window title, takes the grammars whose context matches it. A
+grammar with a lib.modes.ModeTracker is checked once per editor mode, with
+the rules active in that mode only: a normal mode command cannot be
+confused with an insert mode one. Every spec of the active rules (the
+enabled exported rules and the rules they refer to) is expanded into
+phrases (both sides of each optional
+part, one placeholder per extra), and every word is encoded with a
+metaphone-style phonetic key. The phrases are then compared:
+
+ - "homophone": two phrases with different actions sound the same,
+ - "split": in continuous command mode a phrase sounds like two shorter
+   commands said one after the other ("new for loop" vs "new" + "for loop"),
+ - "near": the phonetic keys differ by a single sound,
+ - "prefix": one phrase sounds like the start of another.
+
+Usage::
+
+    python -m benchmarks.collisions [--title TITLE ...] [--limit N]
+                                    [--json FILE]
+"""
+
+import argparse
+import itertools
+import json
+import re
+import sys
+
+from dragonfly import (Alternative, Dictation, Empty, Impossible, ListRef,
+                       Literal, Optional, Repetition, RuleRef, Sequence)
+
+from benchmarks import stub
+from lib.contexts import dispatcher
+from lib.keystrokes import render
+from lib.modes import ModeTracker, modes
+
+
+# Window titles checked by default: one per grammar module, and a python
+#  interpreter running in a command prompt, where both grammars are active.
+default_titles = ["emacs", "command prompt", "python",
+                  "command prompt - python"]
+
+# Risk of each kind of collision, before weighting by similarity.
+risks = {"homophone": 1.0, "split": 0.8, "near": 0.6, "prefix": 0.4}
+
+# Expansions kept per element; optional parts double them.
+max_expansions = 64
+
+_vowels = "aeiou"
+
+
+def metaphone(word):
+    """Return a metaphone-style phonetic key of *word*, e.g. "kill" ->
+    "KAL"."""
+    word = re.sub("[^a-z]", "", word.lower())
+    if not word:
+        return ""
+    for prefix in ("kn", "gn", "pn", "wr", "ae"):
+        if word.startswith(prefix):
+            word = word[1:]
+            break
+    if word.startswith("x"):
+        word = "s" + word[1:]
+    elif word.startswith("wh"):
+        word = "w" + word[2:]
+
+    key = []
+    for i, c in enumerate(word):
+        prev = word[i - 1] if i > 0 else ""
+        next = word[i + 1] if i + 1 < len(word) else ""
+        after = word[i + 2] if i + 2 < len(word) else ""
+        if c == prev and c != "c":
+            continue
+        if c in _vowels:
+            # Unlike metaphone, keep one marker per vowel group: commands
+            #  are short words that often share their consonants.
+            if not prev or prev not in _vowels:
+                key.append("A")
+        elif c == "b":
+            if not (prev == "m" and i == len(word) - 1):
+                key.append("B")
+        elif c == "c":
+            if next == "i" and after == "a" or next == "h":
+                key.append("K" if prev == "s" else "X")
+            elif next in "iey" and next:
+                if prev != "s":
+                    key.append("S")
+            else:
+                key.append("K")
+        elif c == "d":
+            key.append("J" if next == "g" and after in "eiy" and after
+                       else "T")
+        elif c == "g":
+            if next == "h" and after and after not in _vowels:
+                continue
+            if next == "n" and (i + 2 == len(word) or word[i + 2:] == "ed"):
+                continue
+            if prev == "d" and next in "eiy" and next:
+                continue
+            key.append("J" if next in "eiy" and next else "K")
+        elif c == "h":
+            if prev in "csptg" and prev:
+                continue
+            if prev in _vowels and prev and next not in _vowels:
+                continue
+            key.append("H")
+        elif c == "k":
+            if prev != "c":
+                key.append("K")
+        elif c == "p":
+            key.append("F" if next == "h" else "P")
+        elif c == "q":
+            key.append("K")
+        elif c == "s":
+            if next == "h" or next == "i" and after in "oa" and after:
+                key.append("X")
+            else:
+                key.append("S")
+        elif c == "t":
+            if next == "i" and after in "oa" and after:
+                key.append("X")
+            elif next == "h":
+                key.append("0")
+            elif not (next == "c" and after == "h"):
+                key.append("T")
+        elif c == "v":
+            key.append("F")
+        elif c == "w":
+            if next in _vowels and next:
+                key.append("W")
+        elif c == "x":
+            key.append("KS")
+        elif c == "y":
+            if next in _vowels and next:
+                key.append("Y")
+        elif c == "z":
+            key.append("S")
+        else:
+            key.append(c.upper())
+    return "".join(key)
+
+
+def expand(element):
+    """Return the phrases *element* expands to as tuples of words, with
+    "<name>" for every named extra. Return [] if it refers to another
+    rule."""
+    if isinstance(element, Literal):
+        return [tuple(element.words)]
+    if element.name and not isinstance(element, (Literal, RuleRef)):
+        return [("<%s>" % element.name,)]
+    if isinstance(element, (RuleRef, Impossible)):
+        return []
+    if isinstance(element, (Dictation, ListRef)):
+        return [("<dictation>",)]
+    if isinstance(element, Empty):
+        return [()]
+    if isinstance(element, Optional):
+        return [()] + expand(element.children[0])
+    if isinstance(element, Repetition):
+        return expand(element.children[0])
+    if isinstance(element, Sequence):
+        phrases = [()]
+        for child in element.children:
+            phrases = [phrase + tail for phrase in phrases
+                       for tail in expand(child)][:max_expansions]
+        return phrases
+    if isinstance(element, Alternative):
+        phrases = []
+        for child in element.children:
+            phrases.extend(expand(child))
+        return phrases[:max_expansions]
+    return []
+
+
+class Phrase(object):
+
+    def __init__(self, words, grammar, spec, action):
+        self.words = words
+        self.text = " ".join(words)
+        self.grammar = grammar
+        self.spec = spec
+        self.action = action
+        self.codes = tuple(word if word.startswith("<") else metaphone(word)
+                           for word in words)
+        self.key = " ".join(self.codes)
+
+    def __str__(self):
+        return "%r (%s: %s)" % (self.text, self.grammar, self.spec)
+
+
+def active_rules(grammar):
+    """Return the enabled exported rules of *grammar* and the rules they
+    refer to."""
+    rules = []
+
+    def add(element):
+        if isinstance(element, RuleRef):
+            if element.rule not in rules:
+                rules.append(element.rule)
+                add(element.rule.element)
+        elif element is not None:
+            for child in element.children:
+                add(child)
+
+    for rule in grammar.rules:
+        if rule.exported and rule.enabled and rule not in rules:
+            rules.append(rule)
+            add(rule.element)
+    return rules
+
+
+def phrases_of(grammar):
+    """Return the Phrases of the active rules of the dragonfly
+    *grammar*."""
+    result = []
+    for rule in active_rules(grammar):
+        if hasattr(rule, "spec_of"):
+            for compound in rule.element.children:
+                action = render(compound._value)
+                for words in set(expand(compound.children[0])):
+                    result.append(Phrase(words, grammar.name,
+                                         compound._spec, action))
+        elif rule.element is not None:
+            for words in set(expand(rule.element)):
+                result.append(Phrase(words, grammar.name, rule.name,
+                                     rule.name))
+    return [phrase for phrase in result
+            if [True for word in phrase.words if not word.startswith("<")]]
+
+
+def _distance(a, b):
+    """Levenshtein distance between two strings."""
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a):
+        current = [i + 1]
+        for j, cb in enumerate(b):
+            current.append(min(previous[j + 1] + 1, current[j] + 1,
+                               previous[j] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def collisions(phrases):
+    """Return (risk, kind, phrase, other) for colliding *phrases*, the
+    riskiest first."""
+    # The same phrase doing the same thing in two co-active grammars (the
+    #  shared alphabet, for one) is one phrase for the engine.
+    unique = {}
+    for phrase in phrases:
+        unique.setdefault((phrase.text, phrase.action), phrase)
+    phrases = sorted(unique.values(), key=lambda phrase: phrase.text)
+    found = {}
+
+    def add(kind, risk, a, b):
+        if a.action == b.action:
+            return
+        pair = tuple(sorted((a.text + a.grammar, b.text + b.grammar)))
+        if found.get(pair, (0,))[0] < risk:
+            found[pair] = (risk, kind, a, b)
+
+    by_key = {}
+    for phrase in phrases:
+        by_key.setdefault(phrase.key, []).append(phrase)
+
+    for i, a in enumerate(phrases):
+        for b in phrases[i + 1:]:
+            if a.key == b.key:
+                add("homophone", risks["homophone"], a, b)
+                continue
+            shorter, longer = sorted((a, b), key=lambda p: len(p.codes))
+            if longer.codes[:len(shorter.codes)] == shorter.codes:
+                add("prefix", risks["prefix"] * len(shorter.codes)
+                    / len(longer.codes), shorter, longer)
+            elif len(a.key) >= 3 and abs(len(a.key) - len(b.key)) <= 1:
+                if _distance(a.key, b.key) == 1:
+                    add("near", risks["near"]
+                        * (1 - 1.0 / max(len(a.key), len(b.key))), a, b)
+
+    for phrase in phrases:
+        for split in range(1, len(phrase.codes)):
+            heads = by_key.get(" ".join(phrase.codes[:split]))
+            tails = by_key.get(" ".join(phrase.codes[split:]))
+            if heads and tails:
+                add("split", risks["split"], phrase,
+                    _Joined(heads[0], tails[0]))
+                break
+
+    return sorted(found.values(), key=lambda item: (-item[0], item[2].text,
+                                                   "%s" % item[3]))
+
+
+class _Joined(object):
+    """Two commands spoken one after the other."""
+
+    def __init__(self, head, tail):
+        self.head = head
+        self.tail = tail
+        self.text = "%s + %s" % (head.text, tail.text)
+        self.grammar = head.grammar
+        self.action = "%s|%s" % (head.action, tail.action)
+
+    def __str__(self):
+        return "%s + %s" % (self.head, self.tail)
+
+
+def coactive(modules, title):
+    """Return the loaded grammars whose context matches *title*."""
+    active = dispatcher().active(title, title, 1)
+    grammars = []
+    for module in modules:
+        grammar = stub.grammar_of(module)
+        if grammar.context is None or grammar.context in active:
+            grammars.append(grammar)
+    return grammars
+
+
+def mode_scopes(modules):
+    """Set the ModeTrackers of *modules* to every combination of editor
+    modes in turn; yield a label for each ("" without trackers)."""
+    trackers = [module.tracker for module in modules
+                if isinstance(getattr(module, "tracker", None), ModeTracker)]
+    initial = [tracker.mode for tracker in trackers]
+    for combination in itertools.product(modes, repeat=len(trackers)):
+        for tracker, mode in zip(trackers, combination):
+            tracker.set(mode)
+        yield " ".join("[%s mode]" % mode for mode in combination)
+    for tracker, mode in zip(trackers, initial):
+        tracker.set(mode)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--title", action="append",
+                        help="window title to check (repeatable)")
+    parser.add_argument("--limit", type=int, default=20,
+                        help="collisions listed per title")
+    parser.add_argument("--json", help="write every collision to this file")
+    args = parser.parse_args(argv[1:])
+
+    stub.install()
+    modules = [stub.load_module(name) for name in sorted(stub.modules)]
+    report = {}
+    for title in args.title or default_titles:
+        grammars = coactive(modules, title)
+        active = [module for module in modules
+                  if stub.grammar_of(module) in grammars]
+        for scope in mode_scopes(active):
+            phrases = []
+            for grammar in grammars:
+                phrases.extend(phrases_of(grammar))
+            found = collisions(phrases)
+            name = ("%s %s" % (title, scope)).strip()
+            report[name] = [{"risk": round(risk, 2), "kind": kind,
+                             "phrase": "%s" % a, "other": "%s" % b}
+                            for risk, kind, a, b in found]
+            print("%s (%s): %d phrases, %d collisions"
+                  % (name, ", ".join(grammar.name for grammar in grammars),
+                     len(phrases), len(found)))
+            for entry in report[name][:args.limit]:
+                print("  %.2f %-9s %s ~ %s"
+                      % (entry["risk"], entry["kind"], entry["phrase"],
+                         entry["other"]))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
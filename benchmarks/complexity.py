@@ -0,0 +1,210 @@
+"""Static complexity of the grammars, checked against a size budget.
+
+Loads every grammar module on the offline engine of benchmarks.stub and
+walks the element tree of each of its rules, reporting:
+
+ - the number of rules the engine searches: the enabled exported rules
+   and the rules they refer to (the chains of the other editor modes,
+   disabled while the grammar starts in one, are left out; see lib.modes),
+ - per rule, the number of phrases it expands to (log10: a chain of
+   commands expands to astronomically many), counting each dictation slot
+   as one phrase,
+ - per rule, whether it can contain free dictation,
+ - an estimated recognition search cost: one unit per word arc of the
+   grammar, plus ``dictation_cost`` units per dictation slot, since a slot
+   opens the engine's whole dictation vocabulary at that point. Every spec
+   that takes dictation is a slot of its own, even when several specs
+   share the same Dictation extra; a repeated element counts once.
+
+Usage::
+
+    python -m benchmarks.complexity [module ...] [--budget FILE] [--json FILE]
+
+The run fails if a grammar exceeds its entry in the budget file
+(benchmarks/budget.json by default), e.g.::
+
+    {"emacs": {"rules": 4, "cost": 45000, "dictation_rules": 3}}
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+
+from dragonfly import (Alternative, Compound, Dictation, Empty, Impossible,
+                       ListRef, Literal, Optional, RuleRef, Sequence)
+
+from benchmarks import stub
+
+
+default_budget = os.path.join(os.path.dirname(__file__), "budget.json")
+
+# Search cost of a dictation slot, in word arcs.
+dictation_cost = 10000
+
+
+class RuleAnalysis(object):
+    """Phrase count, own word arcs and dictation slots of one rule."""
+
+    def __init__(self, rule):
+        self.rule = rule
+        self.phrases = 0
+        self.arcs = 0
+        self.dictation = 0
+        self.has_dictation = False
+
+    @property
+    def cost(self):
+        return self.arcs + dictation_cost * self.dictation
+
+    @property
+    def phrases_log10(self):
+        if self.phrases <= 0:
+            return None
+        return round(math.log10(self.phrases), 1)
+
+
+class GrammarAnalyzer(object):
+    """Walks the rules of a grammar; rules referenced with RuleRef are
+    analyzed once and their phrases counted where they are referenced."""
+
+    def __init__(self):
+        self._rules = {}
+
+    @property
+    def analyses(self):
+        """The RuleAnalysis of every rule walked so far."""
+        return list(self._rules.values())
+
+    def rule(self, rule):
+        analysis = self._rules.get(rule)
+        if analysis is None:
+            analysis = self._rules[rule] = RuleAnalysis(rule)
+            if rule.element is not None:
+                analysis.phrases = self._walk(rule.element, analysis, set())
+        return analysis
+
+    def _walk(self, element, analysis, seen, spec=None):
+        """Return the number of phrases *element* expands to, adding its
+        arcs to *analysis* the first time it is seen (repetitions share
+        their child), and its dictation slots the first time it is seen in
+        the Compound *spec*."""
+        first = id(element) not in seen
+        seen.add(id(element))
+        if isinstance(element, Compound):
+            spec = id(element)
+        if isinstance(element, RuleRef):
+            referenced = self.rule(element.rule)
+            analysis.has_dictation |= referenced.has_dictation
+            if first:
+                analysis.arcs += 1
+            return referenced.phrases
+        if isinstance(element, Dictation):
+            analysis.has_dictation = True
+            if (spec, id(element)) not in seen:
+                seen.add((spec, id(element)))
+                analysis.dictation += 1
+            return 1
+        if isinstance(element, Literal):
+            if first:
+                analysis.arcs += len(element.words)
+            return 1
+        if isinstance(element, ListRef):
+            if first:
+                analysis.arcs += len(element.list)
+            return len(element.list)
+        if isinstance(element, Impossible):
+            return 0
+        if isinstance(element, Empty):
+            return 1
+        counts = [self._walk(child, analysis, seen, spec)
+                  for child in element.children]
+        if isinstance(element, Optional):
+            return 1 + counts[0]
+        if isinstance(element, Sequence):
+            product = 1
+            for count in counts:
+                product *= count
+            return product
+        if isinstance(element, Alternative) or counts:
+            return sum(counts)
+        return 1
+
+
+def analyze(grammar):
+    """Return the analysis of *grammar* as a dict."""
+    analyzer = GrammarAnalyzer()
+    for rule in grammar.rules:
+        if rule.exported and rule.enabled:
+            analyzer.rule(rule)
+    rules = analyzer.analyses
+    return {
+        "rules": len(rules),
+        "cost": sum(rule.cost for rule in rules),
+        "dictation_rules": len([rule for rule in rules
+                                if rule.has_dictation]),
+        "per_rule": dict((rule.rule.name, {
+            "exported": rule.rule.exported,
+            "phrases_log10": rule.phrases_log10,
+            "arcs": rule.arcs,
+            "dictation": rule.has_dictation,
+            "cost": rule.cost,
+        }) for rule in rules),
+    }
+
+
+def print_report(name, report):
+    print("%s: %d rules, estimated cost %d, %d with dictation"
+          % (name, report["rules"], report["cost"],
+             report["dictation_rules"]))
+    print("  %-28s %14s %8s %10s %10s" % ("rule", "log10 phrases", "arcs",
+                                         "dictation", "cost"))
+    for rule, stats in sorted(report["per_rule"].items()):
+        phrases = stats["phrases_log10"]
+        print("  %-28s %14s %8d %10s %10d"
+              % (rule, "-" if phrases is None else "%.1f" % phrases,
+                 stats["arcs"], "yes" if stats["dictation"] else "no",
+                 stats["cost"]))
+
+
+def over_budget(name, report, budget):
+    """Return a description of every budget entry *report* exceeds."""
+    problems = []
+    for key, limit in sorted(budget.get(name, {}).items()):
+        if report[key] > limit:
+            problems.append("%s: %s %s > %s" % (name, key, report[key],
+                                                limit))
+    return problems
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("modules", nargs="*")
+    parser.add_argument("--budget", default=default_budget)
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args(argv[1:])
+
+    stub.install()
+    reports = {}
+    for name in args.modules or sorted(stub.modules):
+        reports[name] = analyze(stub.grammar_of(stub.load_module(name)))
+        print_report(name, reports[name])
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+    budget = {}
+    if os.path.exists(args.budget):
+        with open(args.budget) as f:
+            budget = json.load(f)
+    failed = False
+    for name, report in sorted(reports.items()):
+        for problem in over_budget(name, report, budget):
+            print("OVER BUDGET: %s" % problem)
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
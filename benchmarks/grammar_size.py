@@ -0,0 +1,42 @@
+"""Grammar compile time and compiled size for the grammar modules.
+
+Loads each module on the offline engine of benchmarks.stub, which also
+builds the LazyGrammar of the module (see lib.lazy), and compiles its
+grammar with the Natlink grammar compiler, which produces the same binary
+grammar Dragon is given on load. Usage::
+
+    python -m benchmarks.grammar_size [module ...]
+"""
+
+import sys
+import time
+
+from dragonfly.engines.backend_natlink.compiler import NatlinkCompiler
+
+from benchmarks import stub
+
+
+def measure(grammar, repeat=5):
+    """Return (best compile time in seconds, compiled size in bytes)."""
+    compiler = NatlinkCompiler()
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        compiled, _ = compiler.compile_grammar(grammar)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(compiled)
+
+
+def main(argv):
+    names = argv[1:] or ["emacs"]
+    stub.install()
+    print("%-20s %12s %12s" % ("module", "compile (ms)", "size (KiB)"))
+    for name in names:
+        module = stub.load_module(name)
+        elapsed, size = measure(stub.grammar_of(module))
+        print("%-20s %12.1f %12.1f" % (name, elapsed * 1000, size / 1024.0))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
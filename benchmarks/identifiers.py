@@ -0,0 +1,79 @@
+"""Identifier formatting throughput under every naming style.
+
+Formats a corpus of identifier phrases with the formatter the grammars
+used to carry (a split and a new list per capitalization pass), with the
+uncached one-pass formatter, and with lib.identifiers.format_identifier,
+both with a cold cache and with phrases being re-dictated (only the
+capitalizing styles are cached). Usage::
+
+    python -m benchmarks.identifiers [phrases]
+"""
+
+import random
+import sys
+import time
+
+from lib import identifiers
+from lib.identifiers import namings, format_identifier, _format
+
+
+words = [
+    "user", "name", "file", "path", "index", "count", "total", "get",
+    "set", "list", "item", "value", "key", "config", "load", "save",
+    "parse", "result", "error", "data", "buffer", "window", "grammar",
+    "rule", "context", "action", "text", "line", "word", "number", "max",
+    "min", "first", "last", "next", "previous", "is", "has", "to", "from",
+]
+
+
+def original_format(spec, text):
+    text = text.upper() if spec[0] else text.lower()
+    words = text.split(" ")
+    if spec[1]:
+        words[0] = words[0].capitalize()
+    if spec[2]:
+        words = [words[0]] + [w.capitalize() for w in words[1:]]
+    return spec[3].join(words)
+
+
+def build_corpus(size, seed=0):
+    generator = random.Random(seed)
+    return [" ".join(generator.choice(words)
+                     for _ in range(generator.randint(1, 4)))
+            for _ in range(size)]
+
+
+def _time(function, corpus, spec):
+    start = time.time()
+    for phrase in corpus:
+        function(spec, phrase)
+    return time.time() - start
+
+
+def main(argv):
+    size = int(argv[1]) if len(argv) > 1 else 20000
+    unique = build_corpus(size)
+    # People re-dictate the same identifiers: draw from a small working set.
+    generator = random.Random(1)
+    repeated = [generator.choice(unique[:200]) for _ in range(size)]
+
+    print("%-16s %12s %12s %12s %12s" % ("naming", "original", "one pass",
+                                          "cold", "repeated"))
+    for name in sorted(namings):
+        spec = namings[name]
+        for phrase in unique[:100]:
+            assert format_identifier(spec, phrase) == \
+                original_format(spec, phrase), (name, phrase)
+        original = _time(original_format, unique, spec)
+        one_pass = _time(_format, unique, spec)
+        identifiers._cache.clear()
+        cold = _time(format_identifier, unique, spec)
+        identifiers._cache.clear()
+        warm = _time(format_identifier, repeated, spec)
+        print("%-16s %10.0f/s %10.0f/s %10.0f/s %10.0f/s" % (
+            name, size / original, size / one_pass, size / cold,
+            size / warm))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
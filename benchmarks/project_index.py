@@ -0,0 +1,96 @@
+"""Lookup latency of the project identifier index (lib.project).
+
+Fills an IdentifierIndex with generated identifiers in every spelling
+(snake_case, camelCase, CamelCase, UPPER_CASE), or with the identifiers
+of a real source tree, and times lookups of dictated phrases that match
+an identifier exactly, that only match one by trigrams (with
+lib.project.fuzzy set), and that match nothing. Usage::
+
+    python -m benchmarks.project_index [identifiers] [--tree DIRECTORY]
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from lib import project
+from lib.project import IdentifierIndex, key_of
+
+from benchmarks.identifiers import words
+
+
+def build_identifiers(size, seed=0):
+    """Return *size* distinct identifiers of 1 to 4 words and their
+    dictated phrases."""
+    generator = random.Random(seed)
+    vocabulary = words + ["%s%s" % (word, suffix) for word in words
+                          for suffix in ("s", "er", "ed", "ing")]
+    spellings = [
+        lambda parts: "_".join(parts),
+        lambda parts: parts[0] + "".join(p.capitalize() for p in parts[1:]),
+        lambda parts: "".join(p.capitalize() for p in parts),
+        lambda parts: "_".join(parts).upper(),
+    ]
+    identifiers = {}
+    while len(identifiers) < size:
+        parts = [generator.choice(vocabulary)
+                 for _ in range(generator.randint(1, 4))]
+        identifier = generator.choice(spellings)(parts)
+        identifiers.setdefault(identifier, " ".join(parts))
+    return identifiers
+
+
+def _time(index, phrases):
+    start = time.time()
+    for phrase in phrases:
+        index.lookup(phrase, phrase.replace(" ", "_"))
+    return (time.time() - start) / len(phrases)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("size", nargs="?", type=int, default=100000)
+    parser.add_argument("--tree", help="index this source tree instead")
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args(argv[1:])
+
+    project.fuzzy = True
+    generator = random.Random(1)
+    start = time.time()
+    if args.tree:
+        index = IdentifierIndex(args.tree)
+        index.scan()
+        phrases = [" ".join(key_of(identifier) for identifier in
+                            [name]) for name in index._counts]
+    else:
+        identifiers = build_identifiers(args.size)
+        index = IdentifierIndex(None)
+        for identifier in identifiers:
+            index.add(identifier)
+        phrases = list(identifiers.values())
+    print("indexed %d identifiers in %.2f s" % (len(index),
+                                                time.time() - start))
+
+    exact = [generator.choice(phrases) for _ in range(args.lookups)]
+    # A letter dropped from a long phrase: only trigrams can find it.
+    long_phrases = [phrase for phrase in phrases if len(phrase) > 16]
+    near = []
+    for phrase in long_phrases[:args.lookups]:
+        position = generator.randrange(1, len(phrase) - 1)
+        near.append(phrase[:position] + phrase[position + 1:])
+    missing = ["zebra quokka %d" % i for i in range(args.lookups)]
+
+    found = len([True for phrase in near
+                 if index.lookup(phrase, phrase) is not None])
+    print("%-10s %12s" % ("lookup", "latency"))
+    for name, sample in (("exact", exact), ("near", near),
+                         ("missing", missing)):
+        if sample:
+            print("%-10s %9.1f us" % (name, _time(index, sample) * 1e6))
+    if near:
+        print("near phrases snapped: %d of %d" % (found, len(near)))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,204 @@
+"""Replay a recorded corpus of phrases against every grammar module.
+
+Loads emacs.py, _cmd.py, _pythoninterpreter.py and _snore.py on the
+offline engine from benchmarks.stub, checks that every phrase of the
+corpus is handled by the rule it was recorded with and emits the
+keystrokes recorded with it (as lib.trace renders them, e.g. "2|d, d" for
+"kill two line"), then replays the corpus and reports:
+
+ - grammar import and load time per module,
+ - throughput in recognitions per second,
+ - action-build latency per command (from lib.timing),
+ - peak memory allocated by Python while loading the grammars and
+   replaying the corpus once.
+
+Usage::
+
+    python -m benchmarks.replay [--corpus FILE] [--passes N] [--json FILE]
+                                [--baseline FILE] [--tolerance 0.2]
+
+With --baseline, the run fails if throughput dropped, or load time grew,
+by more than the tolerance compared to a previous --json report.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from dragonfly import RecognitionObserver
+
+from benchmarks import stub
+from lib import timing, trace
+from lib.execution import action_queue
+
+
+default_corpus = os.path.join(os.path.dirname(__file__), "corpus.txt")
+
+
+def read_corpus(path):
+    """Return the corpus as a list of (window title, words, rule name,
+    keystrokes)."""
+    corpus = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            # The keystrokes are separated by "|" themselves.
+            title, words, rule, keys = [field.strip()
+                                        for field in line.split("|", 3)]
+            corpus.append((title, words, rule, keys))
+    return corpus
+
+
+class RuleObserver(RecognitionObserver):
+    """Remembers which rule handled the last recognition."""
+
+    rule = None
+
+    def on_recognition(self, words, rule):
+        self.rule = rule.name if rule is not None else None
+
+
+def load_modules():
+    """Import and load every grammar module; return their timings."""
+    result = {}
+    for name in sorted(stub.modules):
+        start = time.time()
+        importlib.import_module(name)
+        imported = time.time()
+        stub.load_module(name)
+        result[name] = {"import": imported - start,
+                        "load": time.time() - imported}
+    return result
+
+
+def replay(engine, corpus, observer=None):
+    """Mimic every phrase once; return the phrases that did not resolve
+    to their rule and keystrokes, with what they resolved to."""
+    mismatches = []
+    for title, words, rule, keys in corpus:
+        if observer is not None:
+            observer.rule = None
+            trace.reset()
+        try:
+            engine.mimic(words, **stub.window(title))
+        except Exception as e:
+            mismatches.append((title, words, "%s [%s]" % (rule, keys),
+                               "%s" % e))
+            continue
+        if observer is None:
+            continue
+        record = trace.last()
+        # Corpus lines are stripped: so are the keystrokes.
+        sent = record["keys"].strip() if record is not None else ""
+        if (observer.rule, sent) != (rule, keys):
+            mismatches.append((title, words, "%s [%s]" % (rule, keys),
+                               "%s [%s]" % (observer.rule, sent)))
+    return mismatches
+
+
+def run(corpus_path, passes):
+    tracemalloc.start()
+    engine, sink = stub.install()
+    loading = load_modules()
+
+    corpus = read_corpus(corpus_path)
+    observer = RuleObserver()
+    observer.register()
+    mismatches = replay(engine, corpus, observer)
+    observer.unregister()
+    action_queue().wait()
+    # Tracing allocations slows everything down: stop before timing.
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timing.reset()
+    start = time.time()
+    for _ in range(passes):
+        replay(engine, corpus)
+    action_queue().wait()
+    elapsed = time.time() - start
+
+    builds = [entry for entry in timing.report() if entry["phase"] == "build"]
+    return {
+        "modules": loading,
+        "recognitions": passes * len(corpus),
+        "throughput": passes * len(corpus) / elapsed,
+        "build": dict(("%s: %s" % (entry["rule"], entry["spec"]),
+                       {"p50": entry["p50"], "p90": entry["p90"]})
+                      for entry in builds),
+        "peak_memory": peak,
+        "keyboard_calls": sink.calls,
+        "mismatches": mismatches,
+    }
+
+
+def print_report(report):
+    print("%-20s %12s %12s" % ("module", "import (ms)", "load (ms)"))
+    for name, times in sorted(report["modules"].items()):
+        print("%-20s %12.1f %12.1f" % (name, times["import"] * 1000,
+                                       times["load"] * 1000))
+    print("")
+    print("%-44s %10s %10s" % ("action build", "p50 (us)", "p90 (us)"))
+    for name, build in sorted(report["build"].items()):
+        print("%-44s %10.1f %10.1f" % (name, build["p50"] * 1e6,
+                                       build["p90"] * 1e6))
+    print("")
+    print("recognitions: %d" % report["recognitions"])
+    print("throughput:   %.0f recognitions/s" % report["throughput"])
+    print("peak memory:  %.1f KiB" % (report["peak_memory"] / 1024.0))
+    for title, words, rule, got in report["mismatches"]:
+        print("MISMATCH: %r in %r expected %s, got %s"
+              % (words, title, rule, got))
+
+
+def regressions(report, baseline, tolerance):
+    """Return a description of every regression against *baseline*."""
+    problems = []
+    if report["throughput"] < baseline["throughput"] * (1 - tolerance):
+        problems.append("throughput %.0f/s < %.0f/s"
+                        % (report["throughput"], baseline["throughput"]))
+    for name, times in report["modules"].items():
+        before = baseline["modules"].get(name)
+        if before is None:
+            continue
+        total = times["import"] + times["load"]
+        limit = (before["import"] + before["load"]) * (1 + tolerance)
+        if total > limit:
+            problems.append("%s import+load %.1f ms > %.1f ms"
+                            % (name, total * 1000, limit * 1000))
+    return problems
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--corpus", default=default_corpus)
+    parser.add_argument("--passes", type=int, default=50)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv[1:])
+
+    report = run(args.corpus, args.passes)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failed = bool(report["mismatches"])
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for problem in regressions(report, baseline, args.tolerance):
+            print("REGRESSION: %s" % problem)
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,216 @@
+"""Startup cost of every grammar module, and leftovers that could load.
+
+Natlink imports every top-level .py file of the macro directory when the
+engine starts. This loads each of them on the offline engine of
+benchmarks.stub and times, separately:
+
+ - the import of the module,
+ - the construction of its rules (build_rules() of a LazyGrammar),
+ - grammar.load(), with those rules.
+
+Modules that build and load their grammar at import only have an import
+time. The directory is also checked for files that do not belong there:
+
+ - "orphaned bytecode": a .pyc without its .py, which Python 2 imports
+   anyway,
+ - "stale bytecode": a .pyc older than its .py, written for another
+   Python version, or whose recorded source size and time no longer match
+   the .py,
+ - "backup": editor backups such as ``_cmd.py~``.
+
+Usage::
+
+    python -m benchmarks.startup [--directory DIR] [--json FILE]
+                                 [--baseline FILE] [--tolerance 0.2]
+
+The report is printed and, with --json, written as JSON. The run fails if
+leftovers were found or, with --baseline, if a module's startup grew by
+more than the tolerance compared to a previous --json report.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import struct
+import sys
+
+try:
+    from importlib.util import MAGIC_NUMBER
+except ImportError:
+    import imp
+    MAGIC_NUMBER = imp.get_magic()
+
+from benchmarks import stub
+from lib.lazy import LazyGrammar
+from lib.timing import clock
+
+
+default_directory = os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__)))
+
+backup_suffixes = ("~", ".bak", ".orig", ".swp", ".tmp")
+
+
+def grammar_modules(directory):
+    """Return the names of the modules Natlink would load from
+    *directory*."""
+    return sorted(name[:-len(".py")] for name in os.listdir(directory)
+                  if name.endswith(".py"))
+
+
+def profile_module(name):
+    """Import the grammar module *name* and load its grammar; return its
+    timings in seconds, None for a phase done at import."""
+    start = clock()
+    module = importlib.import_module(name)
+    imported = clock()
+    result = {"import": imported - start, "build": None, "load": None,
+              "rules": None}
+    grammar = getattr(module, "grammar", None)
+    if isinstance(grammar, LazyGrammar):
+        build_rules = grammar._build_rules
+        rules = build_rules()
+        built = clock()
+        grammar._build_rules = lambda: rules
+        try:
+            grammar.load()
+        finally:
+            grammar._build_rules = build_rules
+        result.update(build=built - imported, load=clock() - built,
+                      rules=len(rules))
+    elif grammar is not None:
+        result["rules"] = len(grammar.rules)
+    return result
+
+
+def _source_of_cached(path):
+    """Return the .py a __pycache__ file was compiled from."""
+    directory = os.path.dirname(os.path.dirname(path))
+    name = os.path.basename(path).split(".")[0]
+    return os.path.join(directory, name + ".py")
+
+
+def bytecode_problem(path, source):
+    """Return why the bytecode *path* of *source* should go, or None."""
+    if not os.path.exists(source):
+        return "orphaned bytecode"
+    with open(path, "rb") as f:
+        header = f.read(16)
+    if header[:4] != MAGIC_NUMBER:
+        return "stale bytecode (another Python version)"
+    if os.path.getmtime(path) < os.path.getmtime(source):
+        return "stale bytecode (older than its source)"
+    if len(header) == 16:
+        flags, mtime, size = struct.unpack("<III", header[4:16])
+        if flags == 0 and (
+                mtime != int(os.path.getmtime(source)) & 0xFFFFFFFF
+                or size != os.path.getsize(source) & 0xFFFFFFFF):
+            return "stale bytecode (source changed)"
+    return None
+
+
+def leftovers(directory):
+    """Return (path relative to *directory*, problem) for every leftover
+    file."""
+    found = []
+    for path, names, files in os.walk(directory):
+        names[:] = sorted(name for name in names if not name.startswith("."))
+        for name in sorted(files):
+            full = os.path.join(path, name)
+            problem = None
+            if name.endswith(backup_suffixes) or name.startswith(("#", ".#")):
+                problem = "backup"
+            elif name.endswith((".pyc", ".pyo")):
+                if os.path.basename(path) == "__pycache__":
+                    source = _source_of_cached(full)
+                else:
+                    source = full[:-1]
+                problem = bytecode_problem(full, source)
+            if problem is not None:
+                found.append((os.path.relpath(full, directory), problem))
+    return found
+
+
+def run(directory):
+    # Look for leftovers before importing writes fresh bytecode.
+    found = leftovers(directory)
+    stub.install()
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    modules = {}
+    for name in grammar_modules(directory):
+        modules[name] = profile_module(name)
+    return {
+        "directory": directory,
+        "modules": modules,
+        "total": sum(sum(times[phase] or 0 for phase in
+                         ("import", "build", "load"))
+                     for times in modules.values()),
+        "leftovers": [{"path": path, "problem": problem}
+                      for path, problem in found],
+    }
+
+
+def _ms(seconds):
+    return "at import" if seconds is None else "%.1f" % (seconds * 1000)
+
+
+def print_report(report):
+    print("%-20s %12s %12s %12s %6s" % ("module", "import (ms)",
+                                         "build (ms)", "load (ms)", "rules"))
+    for name, times in sorted(report["modules"].items()):
+        print("%-20s %12s %12s %12s %6s"
+              % (name, _ms(times["import"]), _ms(times["build"]),
+                 _ms(times["load"]),
+                 "-" if times["rules"] is None else times["rules"]))
+    print("total: %.1f ms" % (report["total"] * 1000))
+    for entry in report["leftovers"]:
+        print("LEFTOVER: %s: %s" % (entry["path"], entry["problem"]))
+
+
+def regressions(report, baseline, tolerance):
+    """Return a description of every module whose startup grew by more
+    than *tolerance* against *baseline*."""
+    problems = []
+    for name, times in sorted(report["modules"].items()):
+        before = baseline["modules"].get(name)
+        if before is None:
+            continue
+        total = sum(times[phase] or 0 for phase in ("import", "build",
+                                                    "load"))
+        limit = sum(before[phase] or 0 for phase in ("import", "build",
+                                                     "load"))
+        limit *= 1 + tolerance
+        if total > limit:
+            problems.append("%s startup %.1f ms > %.1f ms"
+                            % (name, total * 1000, limit * 1000))
+    return problems
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--directory", default=default_directory)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv[1:])
+
+    report = run(os.path.abspath(args.directory))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    failed = bool(report["leftovers"])
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for problem in regressions(report, baseline, args.tolerance):
+            print("REGRESSION: %s" % problem)
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
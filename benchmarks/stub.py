@@ -0,0 +1,98 @@
+"""Run the grammar modules without Dragon.
+
+install() connects dragonfly's text engine and replaces the keyboard
+output with a KeyboardSink and the clipboard used for pasting with a
+ClipboardStub, so grammars can be loaded and recognitions mimicked
+offline. Command usage counts and recorded macros go to a temporary
+directory, not the user's:
+
+    engine, sink = stub.install()
+    emacs = stub.load_module("emacs")
+    engine.mimic("kill three word", **stub.window("emacs"))
+"""
+
+import importlib
+import os
+import tempfile
+
+from dragonfly import get_engine
+from dragonfly.actions.action_base_keyboard import BaseKeyboardAction
+
+from lib import macros, usage
+from lib.lazy import LazyGrammar
+from lib.paste import ClipboardPaste
+
+
+# Grammar modules of the macro directory and a window title they match.
+modules = {
+    "emacs": "emacs",
+    "_cmd": "command prompt",
+    "_pythoninterpreter": "python",
+    "_snore": "any window",
+}
+
+
+class KeyboardSink(object):
+    """Counts the keyboard events actions send instead of typing them."""
+
+    def __init__(self):
+        self.calls = 0
+        self.events = 0
+
+    def send_keyboard_events(self, events):
+        self.calls += 1
+        self.events += len(events)
+
+
+class ClipboardStub(object):
+    """In-memory clipboard with the part of dragonfly's Clipboard
+    interface lib.paste uses; *pasted* lists every text set on it."""
+
+    text = None
+    pasted = []
+
+    def __init__(self, from_system=False):
+        self._text = ClipboardStub.text if from_system else None
+
+    @classmethod
+    def set_system_text(cls, text):
+        cls.text = text
+        cls.pasted.append(text)
+
+    def copy_to_system(self):
+        ClipboardStub.text = self._text
+
+
+def install():
+    """Set up the offline engine; return (engine, keyboard sink)."""
+    engine = get_engine("text")
+    engine.connect()
+    sink = KeyboardSink()
+    BaseKeyboardAction._keyboard.send_keyboard_events = \
+        sink.send_keyboard_events
+    ClipboardPaste.clipboard = ClipboardStub
+    ClipboardPaste.restore_delay = 0
+    scratch = tempfile.mkdtemp()
+    usage.path = os.path.join(scratch, "usage.json")
+    macros.path = os.path.join(scratch, "macros.json")
+    return engine, sink
+
+
+def load_module(name):
+    """Import a grammar module and make sure its grammar is loaded."""
+    module = importlib.import_module(name)
+    if isinstance(module.grammar, LazyGrammar):
+        module.grammar.load()
+    return module
+
+
+def grammar_of(module):
+    """Return the dragonfly Grammar of a loaded grammar module."""
+    if isinstance(module.grammar, LazyGrammar):
+        return module.grammar.grammar
+    return module.grammar
+
+
+def window(title, handle=1):
+    """Keyword arguments for engine.mimic() for a window titled *title*."""
+    return {"executable": title, "title": title, "handle": handle}
@@ -0,0 +1,5 @@
+"""Modules shared by the grammars in this directory.
+
+Natlink only loads the ``.py`` files at the top of the macro directory, so
+nothing in this package is picked up as a grammar on its own.
+"""
@@ -0,0 +1,113 @@
+"""Continuous command mode: several commands in a single utterance.
+
+Each grammar keeps its commands in a non-exported MappingRule and exports a
+ContinuousCommandRule built on top of it, so "alpha bravo semi" or
+"kill two word insert variable user name" is recognized once and run as
+one batch instead of costing one utterance per command.
+"""
+
+from dragonfly import (Alternative, CompoundRule, Choice, Dictation,
+                       Repetition, RuleRef, Text)
+
+from lib import paste, timing, trace
+from lib.execution import run
+from lib.identifiers import namings, format_identifier
+from lib.keystrokes import batch
+
+
+def _alternative(rules, name=None):
+    if len(rules) == 1:
+        return RuleRef(rule=rules[0], name=name)
+    return Alternative([RuleRef(rule=rule) for rule in rules], name=name)
+
+
+@timing.instrument
+class ContinuousCommandRule(CompoundRule):
+    """Run up to *max* commands from *commands*, a CommandRule or a list
+    of them, spoken in one utterance.
+
+    The utterance may end with an identifier ("<naming> <text>", as in
+    Identifiers) or with a command that takes dictation ("search
+    [<text>]"): a dictation would swallow the commands spoken after it, so
+    those commands only end a chain (see CommandRule.split_dictation).
+
+    The recognized actions are bound to their extras and run in the order
+    they were spoken, as one keystroke buffer when they are all made of
+    Key and Text actions, on the shared action queue. Long
+    texts are pasted as configured for the grammar in lib.paste. The batch
+    is kept in lib.history for RepeatRule.
+
+    A lib.modes.ModeTracker given as *tracker* sees the commands before
+    they run and may drop their redundant escapes; the batch kept in
+    lib.history still sends them.
+    """
+
+    spec = "<sequence> [<naming> <text>]"
+
+    def __init__(self, commands, max=16, name="continuous", tracker=None):
+        if not isinstance(commands, (list, tuple)):
+            commands = [commands]
+        chained, last = [], []
+        for rule in commands:
+            plain, dictation = rule.split_dictation()
+            if plain is not None:
+                chained.append(plain)
+            if dictation is not None:
+                last.append(dictation)
+        self._commands = chained + last
+        self._tracker = tracker
+        extras = [Choice("naming", namings), Dictation("text")]
+        specs = []
+        if chained:
+            extras.append(Repetition(_alternative(chained), min=1,
+                                     max=max + 1, name="sequence"))
+            specs.append(self.spec)
+        if last:
+            extras.append(_alternative(last, name="last"))
+            specs.append("[<sequence>] <last>" if chained else "<last>")
+        CompoundRule.__init__(self, name=name, spec=" | ".join(specs),
+                              extras=extras)
+
+    def _process_recognition(self, node, extras):
+        actions = list(extras.get("sequence", ()))
+        if "last" in extras:
+            actions.append(extras["last"])
+        specs = self._specs(node)
+        counted = list(specs)
+        data = [action._data for action in actions]
+        sent = actions
+        if self._tracker is not None:
+            # The history and macros keep the escapes the tracker drops:
+            #  the mode may have changed when they are sent again.
+            sent = self._tracker.process(specs, actions)
+        if "naming" in extras:
+            counted.append("<naming> %s" % " ".join(
+                node.get_child_by_name("naming").words()))
+            start = timing.clock()
+            text = extras["text"].format()
+            identifier = Text(format_identifier(extras["naming"], text))
+            actions = actions + [identifier]
+            sent = sent + [identifier]
+            timing.record(self.name, "<naming> <text>", "build",
+                          timing.clock() - start)
+            specs.append("<naming> <text>")
+            data.append({"text": text})
+        grammar_paste = paste.for_grammar(self.grammar.name)
+        kept = None
+        if any(a is not b for a, b in zip(sent, actions)):
+            kept = batch(actions, grammar_paste)
+        run(self, " + ".join(specs), batch(sent, grammar_paste),
+            " + ".join(trace.format_extras(spec, values)
+                       for spec, values in zip(specs, data)),
+            counted=counted, kept=kept)
+
+    def _specs(self, node):
+        """Return the specs of the commands recognized under *node*."""
+        specs = []
+        for child in node.children:
+            if (isinstance(child.actor, RuleRef)
+                    and child.actor.rule in self._commands):
+                specs.append(child.actor.rule.spec_of(child.children[0]))
+            else:
+                specs.extend(self._specs(child))
+        return specs
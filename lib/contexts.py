@@ -0,0 +1,88 @@
+"""Evaluate every grammar context once per foreground window.
+
+Each loaded grammar matches its own context at the start of every
+utterance, so with N grammars the window title is checked N times per
+utterance even though the window hardly ever changes. A ContextDispatcher
+evaluates all the contexts registered with it together, the first time a
+given window (handle, title and executable) is seen, and answers from that
+cache afterwards.
+
+``dispatcher().statistics()`` reports how often the contexts were really
+evaluated and how long that took.
+"""
+
+import time
+
+from dragonfly import Context
+
+
+class CachedContext(Context):
+    """Context answered by a ContextDispatcher."""
+
+    def __init__(self, dispatcher, context):
+        Context.__init__(self)
+        self._dispatcher = dispatcher
+        self._context = context
+        self._str = "%s" % context
+
+    def matches(self, executable, title, handle):
+        return self in self._dispatcher.active(executable, title, handle)
+
+
+class ContextDispatcher(object):
+
+    def __init__(self, cache_size=128):
+        self._contexts = []
+        self._cache = {}
+        self._cache_size = cache_size
+        self.lookups = 0
+        self.evaluations = 0
+        self.evaluation_time = 0.0
+
+    def register(self, context):
+        """Return a context that matches like *context*, through the cache."""
+        cached = CachedContext(self, context)
+        self._contexts.append(cached)
+        self._cache.clear()
+        return cached
+
+    def unregister(self, cached):
+        if cached in self._contexts:
+            self._contexts.remove(cached)
+        self._cache.clear()
+
+    def active(self, executable, title, handle):
+        """Return the set of registered contexts matching the window."""
+        self.lookups += 1
+        key = (handle, title, executable)
+        active = self._cache.get(key)
+        if active is None:
+            start = time.time()
+            active = frozenset(cached for cached in self._contexts
+                               if cached._context.matches(executable, title,
+                                                          handle))
+            self.evaluation_time += time.time() - start
+            self.evaluations += 1
+            if len(self._cache) >= self._cache_size:
+                self._cache.clear()
+            self._cache[key] = active
+        return active
+
+    def statistics(self):
+        return {
+            "contexts": len(self._contexts),
+            "lookups": self.lookups,
+            "evaluations": self.evaluations,
+            "evaluation_time": self.evaluation_time,
+        }
+
+
+_dispatcher = None
+
+
+def dispatcher():
+    """Return the ContextDispatcher shared by every grammar."""
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = ContextDispatcher()
+    return _dispatcher
@@ -0,0 +1,282 @@
+"""Command mappings declared in data files instead of Python dicts.
+
+Every grammar's commands live in ``grammars/<name>.ini``. The actions are
+written as in Python, limited to Key and Text actions with a literal spec
+and combined with ``+``::
+
+    [grammar]
+    extends = base
+
+    [mapping]
+    # editing
+    kill [<n>] word = Key("escape") + Text("%(n)d") + Key("d, w")
+    insert doc string = Key("escape, i, dquote, dquote, escape, i") +
+        Key("dquote, dquote, escape, i")
+
+A file extends another one, ``base.ini`` holding the alphabet, digits and
+symbols every grammar shares; its own entries win over inherited ones.
+
+Commands can be scoped to an editor mode (see lib.modes): those of a
+``[mapping <mode>]`` section only make sense in that mode, and an action
+ending in ``-> <mode>`` leaves the editor in that mode::
+
+    [grammar]
+    extends = base
+    inherited mode = insert
+
+    [mapping]
+    insert = Key("escape, i") -> insert
+
+    [mapping normal]
+    join lines = Key("J")
+
+The ``inherited mode`` option scopes the commands of the extended file.
+modes() returns the scopes; parts() and load() ignore them.
+
+Reading and checking a file happens once: its parsed actions, plain
+``(action type, spec)`` tuples, are pickled to
+``grammars/.cache/<name>.pickle`` together with a hash of the file, and
+later loads unpickle them as long as the file has not changed. Only the
+Key and Text objects are built on every load (and compiled with
+lib.keystrokes); dragonfly's parsed keyboard events cannot be pickled.
+Bump ``version`` whenever the parsed format changes.
+"""
+
+import ast
+import hashlib
+import logging
+import os
+import re
+import sys
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+try:
+    from configparser import RawConfigParser
+except ImportError:
+    from ConfigParser import RawConfigParser
+
+from dragonfly import Key, Text
+
+from lib.keystrokes import compile_mapping
+
+
+directory = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "grammars")
+cache_directory = os.path.join(directory, ".cache")
+
+version = 2
+
+_log = logging.getLogger("definitions")
+
+_action_types = {"Key": Key, "Text": Text}
+
+# Mappings loaded so far, by file name; base files are shared.
+_loaded = {}
+# Scopes of the commands, by file name.
+_modes = {}
+
+# "-> insert" at the end of an action.
+_result_pattern = re.compile(r"\s*->\s*(\w+)\s*$")
+
+
+def _parts(node, where):
+    """Return the (action type, spec) parts of the expression *node*."""
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        return _parts(node.left, where) + _parts(node.right, where)
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+            and node.func.id in _action_types and len(node.args) == 1
+            and not node.keywords):
+        try:
+            spec = ast.literal_eval(node.args[0])
+        except ValueError:
+            spec = None
+        if isinstance(spec, str):
+            return ((node.func.id, spec),)
+    raise ValueError("%s: only Key(\"...\") and Text(\"...\") actions"
+                     " joined with + are supported" % where)
+
+
+def parse_action(source, where="<action>"):
+    """Return the parts of the action written as *source*, e.g.
+    'Key("c-s") + Text("x")' -> (("Key", "c-s"), ("Text", "x"))."""
+    try:
+        tree = ast.parse("(%s)" % source.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ValueError("%s: %s" % (where, e))
+    return _parts(tree.body, where)
+
+
+def build_action(parts):
+    """Return the action made of the (action type, spec) *parts*."""
+    action = None
+    for kind, spec in parts:
+        part = _action_types[kind](spec)
+        action = part if action is None else action + part
+    return action
+
+
+def parse(path):
+    """Return (name of the extended file or None, mode of its commands or
+    None, {spec: parts}, {spec: (mode or None, resulting mode or None)})."""
+    parser = RawConfigParser()
+    parser.optionxform = str
+    with open(path) as f:
+        if hasattr(parser, "read_file"):
+            parser.read_file(f)
+        else:
+            parser.readfp(f)
+    extends = inherited = None
+    if parser.has_option("grammar", "extends"):
+        extends = parser.get("grammar", "extends").strip() or None
+    if parser.has_option("grammar", "inherited mode"):
+        inherited = parser.get("grammar", "inherited mode").strip() or None
+    mapping = {}
+    modes = {}
+    for section in parser.sections():
+        words = section.split()
+        if words[0] != "mapping":
+            continue
+        if len(words) > 2:
+            raise ValueError("%s: bad section [%s]"
+                             % (os.path.basename(path), section))
+        mode = words[1] if len(words) == 2 else None
+        for spec, source in parser.items(section):
+            where = "%s: %s" % (os.path.basename(path), spec)
+            if spec in mapping:
+                raise ValueError("%s is declared twice" % where)
+            result = _result_pattern.search(source)
+            if result is not None:
+                source = source[:result.start()]
+                result = result.group(1)
+            mapping[spec] = parse_action(source, where)
+            if mode is not None or result is not None:
+                modes[spec] = (mode, result)
+    return extends, inherited, mapping, modes
+
+
+def _digest(source):
+    return hashlib.sha1(b"%d %d.%d " % ((version,) + sys.version_info[:2])
+                        + source).hexdigest()
+
+
+def _cache_path(name):
+    return os.path.join(cache_directory, "%s.pickle" % name)
+
+
+def _read_cache(name, digest):
+    try:
+        with open(_cache_path(name), "rb") as f:
+            if pickle.load(f) != digest:
+                return None
+            return pickle.load(f)
+    except (IOError, OSError, EOFError, pickle.UnpicklingError,
+            AttributeError, ImportError):
+        return None
+
+
+def _write_cache(name, digest, definition):
+    try:
+        if not os.path.isdir(cache_directory):
+            os.makedirs(cache_directory)
+        temporary = _cache_path(name) + ".tmp"
+        with open(temporary, "wb") as f:
+            pickle.dump(digest, f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(definition, f, pickle.HIGHEST_PROTOCOL)
+        if os.path.exists(_cache_path(name)):
+            os.remove(_cache_path(name))
+        os.rename(temporary, _cache_path(name))
+    except (IOError, OSError) as e:
+        _log.warning("Could not cache %s: %s", name, e)
+
+
+def compile_file(name):
+    """Return parse() of ``<name>.ini``, from the cache if it is up to
+    date, otherwise parsing the file and caching the result."""
+    path = os.path.join(directory, "%s.ini" % name)
+    with open(path, "rb") as f:
+        digest = _digest(f.read())
+    definition = _read_cache(name, digest)
+    if definition is None:
+        definition = parse(path)
+        _write_cache(name, digest, definition)
+    return definition
+
+
+def check(name, _seen=()):
+    """Parse ``<name>.ini`` and the files it extends, raising the error of
+    the first one that does not parse; the loaded mappings are left
+    alone."""
+    if name in _seen:
+        raise ValueError("%s.ini extends itself" % name)
+    extends = compile_file(name)[0]
+    if extends is not None:
+        check(extends, _seen + (name,))
+
+
+def parts(name, _seen=()):
+    """Return the parsed actions of ``<name>.ini`` merged over the ones it
+    extends, as {spec: parts}."""
+    if name in _seen:
+        raise ValueError("%s.ini extends itself" % name)
+    extends, _, own, _ = compile_file(name)
+    result = {}
+    if extends is not None:
+        result.update(parts(extends, _seen + (name,)))
+    result.update(own)
+    return result
+
+
+def modes(name, _seen=()):
+    """Return the {spec: (mode, resulting mode)} of the commands of
+    ``<name>.ini`` and the ones it extends that are scoped to a mode or
+    change it; either may be None."""
+    result = _modes.get(name)
+    if result is None:
+        if name in _seen:
+            raise ValueError("%s.ini extends itself" % name)
+        extends, inherited, own, own_modes = compile_file(name)
+        result = {}
+        if extends is not None:
+            for spec, (mode, after) in modes(extends,
+                                             _seen + (name,)).items():
+                result[spec] = (mode or inherited, after)
+            if inherited is not None:
+                for spec in parts(extends):
+                    result.setdefault(spec, (inherited, None))
+        for spec in own:
+            result.pop(spec, None)
+        result.update(own_modes)
+        _modes[name] = result
+    return result
+
+
+def load(name, _seen=()):
+    """Return the mapping of ``<name>.ini`` merged over the ones it
+    extends.
+
+    The actions are compiled with lib.keystrokes. Entries inherited from a
+    base file are the same action objects in every grammar that extends
+    it.
+    """
+    mapping = _loaded.get(name)
+    if mapping is None:
+        if name in _seen:
+            raise ValueError("%s.ini extends itself" % name)
+        extends, _, own, _ = compile_file(name)
+        mapping = {}
+        if extends is not None:
+            mapping.update(load(extends, _seen + (name,)))
+        mapping.update(compile_mapping(dict(
+            (spec, build_action(parts)) for spec, parts in own.items())))
+        _loaded[name] = mapping
+    return dict(mapping)
+
+
+def reset():
+    """Forget the mappings loaded so far, e.g. after editing a file."""
+    _loaded.clear()
+    _modes.clear()
@@ -0,0 +1,123 @@
+"""Run actions on a worker thread instead of inside the engine callback.
+
+Sending a long key chain or a long identifier from the recognition
+callback keeps the engine from processing the next utterance until the
+last key is out. Rules submit their actions to the shared ActionQueue
+instead and return immediately; a single worker thread executes them
+strictly in the order they were submitted.
+
+run() is what a rule does with the action it built: submit it and note
+it in lib.timing, lib.usage, lib.history and lib.trace.
+
+ActionQueue.cancel() drops everything still waiting. CancelRule ("cancel
+that") calls it from the recognition callback, without queueing behind
+the actions it cancels.
+"""
+
+import logging
+import threading
+from functools import partial
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from dragonfly import CompoundRule
+
+from lib import timing, trace, usage
+from lib.keystrokes import render
+
+
+class ActionQueue(object):
+
+    _log = logging.getLogger("action.queue")
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, action, data=None, done=None):
+        """Queue *action* to be executed with *data*.
+
+        *done*, if given, is called on the worker thread with the time the
+        execution took, in seconds.
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name="action queue")
+                self._thread.daemon = True
+                self._thread.start()
+            self._queue.put((self._generation, action, data, done))
+
+    def cancel(self):
+        """Drop the actions that have not started executing yet."""
+        with self._lock:
+            self._generation += 1
+
+    def wait(self):
+        """Block until every queued action has been executed or dropped."""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            generation, action, data, done = self._queue.get()
+            try:
+                if generation == self._generation:
+                    start = timing.clock()
+                    action.execute(data)
+                    if done is not None:
+                        done(timing.clock() - start)
+            except Exception as e:
+                self._log.exception("Executing %s failed: %s", action, e)
+            finally:
+                self._queue.task_done()
+
+
+_action_queue = None
+
+
+def action_queue():
+    """Return the ActionQueue shared by every rule."""
+    global _action_queue
+    if _action_queue is None:
+        _action_queue = ActionQueue()
+    return _action_queue
+
+
+def run(rule, spec, action, extras, counted=(), started=None,
+        repeatable=True, keys=None, kept=None):
+    """Submit *action*, which *rule* built for *spec*, and note it.
+
+    *extras* and *keys* (by default the rendered *action*) go to the
+    trace, each spec of *counted* is counted in lib.usage and, if
+    *started* is the clock() time the rule started building *action*, the
+    build time is recorded. The action, or *kept* if given (the action as
+    it should be sent again, see lib.modes), is added to the history of
+    the grammar; RepeatRule only repeats *repeatable* ones.
+    """
+    # lib.history imports this module for RepeatRule.
+    from lib.history import history
+    grammar = rule.grammar.name
+    if started is not None:
+        timing.record(rule.name, spec, "build", timing.clock() - started)
+    for counted_spec in counted:
+        usage.count(grammar, counted_spec)
+    action_queue().submit(action, done=partial(timing.record, rule.name,
+                                               spec, "execute"))
+    history().add(grammar, action if kept is None else kept,
+                  repeatable=repeatable)
+    trace.record(grammar, rule.name, spec, extras,
+                 render(action) if keys is None else keys)
+
+
+class CancelRule(CompoundRule):
+    """Drop the queued actions that have not been sent yet."""
+
+    spec = "cancel that"
+
+    def _process_recognition(self, node, extras):
+        action_queue().cancel()
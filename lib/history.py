@@ -0,0 +1,96 @@
+"""The last commands run, to repeat them without speaking them again.
+
+"again" relies on the editor's own repeat, which only knows about the
+last change. Every action a rule runs (see lib.execution.run) is added
+to the shared History instead: the action as it was sent, with the extras
+already bound and its keyboard events cached. RepeatRule sends the last
+ones again:
+
+    do that five times
+    do the last three commands two times
+
+Nothing is recognized, interpolated or parsed again: the cached events
+are repeated and sent as one emission (see lib.keystrokes.Replay). Each
+grammar only repeats its own commands.
+"""
+
+from collections import deque
+
+from dragonfly import CompoundRule
+
+from lib.execution import run
+from lib.keystrokes import Replay, render
+from lib.numbers import Digits
+
+
+class History(object):
+    """The last *size* actions run, with the grammar they came from."""
+
+    def __init__(self, size=16):
+        self._entries = deque(maxlen=size)
+        # Callables given the grammar and action of every action run,
+        #  repeats included (see lib.macros).
+        self.on_add = []
+
+    def add(self, grammar, action, repeatable=True):
+        """Note that *grammar* ran *action*; RepeatRule only repeats
+        *repeatable* ones."""
+        if repeatable:
+            self._entries.append((grammar, action))
+        for callback in self.on_add:
+            callback(grammar, action)
+
+    def last(self, grammar, count=1):
+        """Return up to *count* of the last actions of *grammar*, oldest
+        first."""
+        actions = []
+        for name, action in reversed(self._entries):
+            if len(actions) == count:
+                break
+            if name == grammar:
+                actions.append(action)
+        actions.reverse()
+        return actions
+
+    def clear(self):
+        self._entries.clear()
+
+
+_history = None
+
+
+def history():
+    """Return the History shared by every grammar."""
+    global _history
+    if _history is None:
+        _history = History()
+    return _history
+
+
+class RepeatRule(CompoundRule):
+    """Send the last command, or the last <count> ones, <n> times.
+
+    The mode a lib.modes.ModeTracker given as *tracker* follows is unknown
+    after a repeat.
+    """
+
+    spec = "do (that | the last <count> commands) <n> times"
+    extras = [Digits("count", max_digits=2), Digits("n", max_digits=3)]
+    defaults = {"count": 1}
+
+    def __init__(self, tracker=None):
+        self._tracker = tracker
+        CompoundRule.__init__(self)
+
+    def _process_recognition(self, node, extras):
+        actions = history().last(self.grammar.name, extras["count"])
+        if not actions:
+            return
+        run(self, self.spec, Replay(actions, extras["n"]),
+            "count=%d, n=%d" % (len(actions), extras["n"]),
+            repeatable=False,
+            keys="%s x %d" % (" + ".join(render(action)
+                                         for action in actions),
+                              extras["n"]))
+        if self._tracker is not None:
+            self._tracker.set(None)
@@ -0,0 +1,139 @@
+"""Reload a grammar's commands when its data file changes.
+
+A grammar module asks for its CommandRules to follow its data file:
+
+    hotreload.reloader().watch("emacs", [rules, rare_rules], grammar,
+                               on_reload=tracker.reload)
+
+The Reloader watches ``grammars/`` with an OS-level DirectoryWatcher.
+When a ``.ini`` file is saved, the watched grammars are compared spec by
+spec against their files at the start of the next utterance:
+
+ - when only actions changed, the new actions are swapped into the loaded
+   rules, without touching the grammar the engine has,
+ - when specs were added or removed, or moved to another mode (see
+   lib.modes), only that grammar is unloaded and its rules rebuilt; the
+   LazyGrammar loads it again as soon as its context matches.
+
+Either way the grammar's *on_reload* callable, if any, is called then
+(e.g. ModeTracker.reload, see lib.modes). Changes are applied at the start of an utterance (LoaderGrammar.on_begin) on the
+engine's thread, never from the watcher's. The watched files are all
+parsed before anything loaded from them is forgotten: if one does not
+parse, the error is logged and every grammar keeps its previous commands
+until the file is saved again.
+"""
+
+import logging
+import threading
+
+from lib import definitions
+from lib.lazy import loader
+from lib.watcher import DirectoryWatcher
+
+
+def diff(old, new):
+    """Return the (added, removed, changed) specs between two
+    {spec: parts} mappings."""
+    added = sorted(set(new) - set(old))
+    removed = sorted(set(old) - set(new))
+    changed = sorted(spec for spec in set(old) & set(new)
+                     if old[spec] != new[spec])
+    return added, removed, changed
+
+
+class Reloader(object):
+
+    _log = logging.getLogger("hotreload")
+
+    def __init__(self, directory=definitions.directory):
+        self._watched = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._watcher = DirectoryWatcher(directory, self.changed)
+        self._started = False
+
+    def watch(self, name, rules, grammar, on_reload=None):
+        """Keep the CommandRules *rules* of the LazyGrammar *grammar* in
+        sync with ``<name>.ini``; each keeps the specs it selects.
+        *on_reload* is called once they have been brought up to date."""
+        self._watched[name] = [rules, grammar, on_reload,
+                               definitions.parts(name),
+                               definitions.modes(name)]
+        if not self._started:
+            self._started = True
+            if self.apply not in loader().on_begin:
+                loader().on_begin.append(self.apply)
+            try:
+                self._watcher.start()
+            except (ImportError, OSError) as e:
+                self._log.warning("Grammar files will not be reloaded: %s",
+                                  e)
+
+    def unwatch(self, name):
+        self._watched.pop(name, None)
+        if not self._watched and self._started:
+            self._watcher.stop()
+            self._started = False
+
+    def changed(self, filename):
+        """Note that *filename* changed; called from the watcher thread."""
+        if filename.endswith(".ini"):
+            with self._lock:
+                self._pending.add(filename[:-len(".ini")])
+
+    def apply(self):
+        """Bring the watched rules up to date with the changed files."""
+        if not self._pending:
+            return
+        with self._lock:
+            changed, self._pending = self._pending, set()
+        self._log.info("Grammar files changed: %s", ", ".join(sorted(changed)))
+        # A file may be extended by others: compare every watched grammar,
+        #  once all of their files parse.
+        for name in sorted(self._watched):
+            try:
+                definitions.check(name)
+            except Exception as e:
+                self._log.error("Not reloading, %s does not parse: %s",
+                                name, e)
+                return
+        definitions.reset()
+        for name, entry in sorted(self._watched.items()):
+            try:
+                self._reload(name, entry)
+            except Exception as e:
+                self._log.error("Could not reload %s: %s", name, e)
+
+    def _reload(self, name, entry):
+        rules, grammar, on_reload, old, old_modes = entry
+        new = definitions.parts(name)
+        new_modes = definitions.modes(name)
+        added, removed, changed = diff(old, new)
+        if not (added or removed or changed) and old_modes == new_modes:
+            return
+        mapping = definitions.load(name)
+        if added or removed or old_modes != new_modes:
+            grammar.unload()
+            for rule in rules:
+                rule.remap(mapping)
+        else:
+            for spec in changed:
+                for rule in rules:
+                    if spec in rule._mapping:
+                        rule.replace_action(spec, mapping[spec])
+        entry[3:] = [new, new_modes]
+        if on_reload is not None:
+            on_reload()
+        self._log.info("Reloaded %s: %d added, %d removed, %d changed",
+                       name, len(added), len(removed), len(changed))
+
+
+_reloader = None
+
+
+def reloader():
+    """Return the Reloader shared by every grammar module."""
+    global _reloader
+    if _reloader is None:
+        _reloader = Reloader()
+    return _reloader
@@ -0,0 +1,109 @@
+"""Formatting of dictated identifiers ("variable user name" -> userName).
+
+A naming style is a tuple of (all uppercase, capitalize first word,
+capitalize the other words, separator). Adding a style only takes a new
+entry in ``namings``.
+
+Styles separated by ``snapped_separators`` name things in code: when a
+project is indexed (see lib.project), an existing identifier made of the
+same words wins over the formatted one.
+"""
+
+from dragonfly import CompoundRule, Choice, Dictation, Text
+
+from lib import paste, project, timing
+from lib.execution import run
+from lib.keystrokes import batch
+
+
+namings = {
+    "constant": (True, False, False, "_"),
+    "variable": (False, False, True, ""),
+    "snake": (False, False, False, "_"),
+    "class": (False, True, True, ""),
+    "fragment": (False, False, False, " "),
+    "sentence": (False, True, False, " "),
+    "file path": (False, False, False, "\\"),
+    "slash path": (False, False, False, "/"),
+    "dot notation": (False, False, False, "."),
+    "dotted constant": (True, False, False, "."),
+    "kebab": (False, False, False, "-"),
+}
+
+snapped_separators = set(["", "_", "-"])
+
+# Recently formatted (spec, text) pairs of the capitalizing styles;
+#  identifiers get re-dictated a lot. The others take a single replace(),
+#  cheaper than the lookup. The cache is simply emptied when it fills up.
+_cache = {}
+_cache_size = 1024
+
+
+def _format(spec, text):
+    upper, first, rest, separator = spec
+    text = text.upper() if upper else text.lower()
+    if not (first or rest):
+        # Only the separator changes: a single replace does it.
+        return text.replace(" ", separator)
+    words = text.split(" ")
+    if first:
+        words[0] = words[0].capitalize()
+    if rest:
+        words[1:] = [word.capitalize() for word in words[1:]]
+    return separator.join(words)
+
+
+def format_identifier(spec, text):
+    """Format the dictated *text* according to the naming *spec*, or
+    return the existing identifier of the project it matches."""
+    upper, first, rest, separator = spec
+    if not (first or rest):
+        result = (text.upper() if upper else text.lower()).replace(
+            " ", separator)
+    else:
+        key = (spec, text)
+        result = _cache.get(key)
+        if result is None:
+            if len(_cache) >= _cache_size:
+                _cache.clear()
+            result = _cache[key] = _format(spec, text)
+    if separator in snapped_separators:
+        result = project.snap(text, result)
+    return result
+
+
+@timing.instrument
+class Identifiers(CompoundRule):
+    """The class identifiers was taken from Cesar Crusius' repository
+    (https://github.com/ccrusius/dragonfly-modules).
+    The specs determine the properties of the words.
+
+    The options are the following:
+    If the first spec is true then all the letters are uppercase.
+
+    If the second spec is true then the first words will be cap.
+
+    If the third spec is true then the first letter of each word will be cap,
+    except for the first word.
+
+    If the fourth spec is true then the separator specified will be
+    used to join the words.
+    """
+
+    spec = "<naming> <text>"
+    extras = [
+        Choice("naming", namings),
+        Dictation("text")
+    ]
+
+
+    def _process_recognition(self, node, extras):
+        start = timing.clock()
+        spec = extras["naming"]
+        text = extras["text"].format()
+        action = batch([Text(format_identifier(spec, text))],
+                       paste.for_grammar(self.grammar.name))
+        run(self, self.spec, action, "text=%s" % text,
+            counted=["<naming> %s" % " ".join(
+                node.get_child_by_name("naming").words())],
+            started=start)
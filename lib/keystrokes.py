@@ -0,0 +1,402 @@
+"""Send a run of Key and Text actions to the keyboard in one call.
+
+``Key("escape") + Text("%(n)d") + Key("d, w")`` executes as three separate
+actions, each one building and sending its own batch of keyboard events.
+compile_action() flattens such a composition once, when the mapping is
+built, into a Keystrokes action. At execution time Keystrokes only
+interpolates the dynamic specs with the extras, converts every part into
+keyboard events and sends the whole buffer at once.
+
+The keyboard events built for a given set of extras values (n=1, n=2, ...)
+are kept in a small LRU cache on the action, so repeating a command such
+as "kill [<n>] line" skips interpolation and parsing altogether. batch()
+combines the bound actions of several commands into one Keystrokes whose
+parts are those actions: it reuses the cached events of each of them and
+only concatenates them.
+
+Given a lib.paste.ClipboardPaste, Text parts longer than its threshold are
+pasted instead of typed, between the keyboard events of the other parts.
+
+without_first() drops a leading keystroke that is known to be redundant,
+such as the escape of an editor command when the editor is already in
+normal mode (see lib.modes).
+
+Anything other than plain Key and Text actions (Function, Mimic, Pause,
+autoformatted Text, ...) is left untouched and runs the usual way.
+"""
+
+import re
+from collections import OrderedDict
+
+from dragonfly import ActionBase, ActionError, Key, Text
+from dragonfly.actions.action_base import ActionSeries, BoundAction
+
+
+# Extras values that can be part of a cache key. Dictation results and
+# other objects are never cached.
+try:
+    _cacheable = (type(None), bool, int, long, float, str, unicode)
+except NameError:
+    _cacheable = (type(None), bool, int, float, str)
+
+_name_pattern = re.compile(r"%\((\w+)\)")
+
+
+class Keystrokes(ActionBase):
+    """Key and Text actions emitted as a single keyboard event buffer.
+
+    *parts* is a list of ``(action, data)`` pairs, the actions being Key,
+    Text or other Keystrokes actions. A part whose data is None is
+    interpolated with the data given to execute(), otherwise with its own
+    bound data.
+
+    Up to *cache_size* event buffers are cached, keyed by the values of
+    the extras the dynamic specs refer to.
+
+    Long texts are pasted with *paste*, if given (see lib.paste).
+    """
+
+    def __init__(self, parts, cache_size=32, paste=None):
+        ActionBase.__init__(self)
+        self._parts = parts
+        self._paste = paste
+        self._str = ", ".join("%s" % action for action, _ in parts)
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+
+        # Names of the extras the cache key is built from. Parts that
+        #  carry their own data send the same events every time.
+        names = set()
+        for action, bound in parts:
+            if bound is not None:
+                continue
+            if isinstance(action, Keystrokes):
+                names.update(action._names)
+            elif not action._static:
+                names.update(_name_pattern.findall(action._spec))
+        self._names = sorted(names)
+
+    def require_hardware_events(self):
+        if not self._parts:
+            return False
+        return self._parts[0][0].require_hardware_events()
+
+    def _execute(self, data=None):
+        if not self._parts:
+            return True
+        self.send(self.segments(data))
+        return True
+
+    def segments(self, data=None, paste=None):
+        """Return the lists of keyboard events to send for *data* and,
+        between them, the texts to paste, from the cache if possible.
+
+        Texts are pasted with *paste* if given, otherwise with the one
+        given to the constructor.
+        """
+        if not self._parts:
+            return []
+        paste = paste or self._paste
+        hardware = self.require_hardware_events()
+        key = self._cache_key(data, hardware, paste)
+        segments = self._cache.pop(key, None) if key is not None else None
+        if segments is None:
+            segments = self._build_segments(data, hardware, paste)
+        if key is not None:
+            self._cache[key] = segments
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return segments
+
+    def send(self, segments):
+        """Send segments() to the keyboard, pasting the texts."""
+        for segment in segments:
+            if isinstance(segment, list):
+                Key._keyboard.send_keyboard_events(segment)
+            else:
+                self._paste.send(segment)
+
+    def _cache_key(self, data, hardware, paste):
+        key = [hardware, paste]
+        for name in self._names:
+            value = data.get(name) if data else None
+            if not isinstance(value, _cacheable):
+                return None
+            key.append(value)
+        return tuple(key)
+
+    def _build_segments(self, data, hardware, paste):
+        """Return the lists of keyboard events to send and, between them,
+        the texts to paste."""
+        segments = []
+        events = []
+        for action, bound in self._parts:
+            if bound is not None:
+                part_data = bound
+            else:
+                part_data = data
+            if isinstance(action, Keystrokes):
+                for segment in action.segments(part_data, paste):
+                    if isinstance(segment, list):
+                        events.extend(segment)
+                        continue
+                    if events:
+                        segments.append(events)
+                        events = []
+                    segments.append(segment)
+                continue
+            if paste is not None and isinstance(action, Text):
+                text = _interpolate(action, part_data)
+                if paste.wants(text):
+                    if events:
+                        segments.append(events)
+                        events = []
+                    segments.append(text)
+                    continue
+            events.extend(_keyboard_events(action, part_data, hardware))
+        if events or not segments:
+            segments.append(events)
+        return segments
+
+
+def _interpolate(action, data):
+    """Return the spec of *action* with *data* interpolated."""
+    spec = action._spec
+    if data and not action._static:
+        try:
+            spec = spec % data
+        except KeyError:
+            raise ActionError("%s: spec %r doesn't match data %r"
+                              % (action, action._spec, data))
+    return spec
+
+
+def _parse(action, data):
+    """Return the parsed events of *action*, interpolating *data*."""
+    if action._static:
+        return action._events
+    return action._parse_spec(_interpolate(action, data))
+
+
+def _keyboard_events(action, data, hardware):
+    hardware = hardware or getattr(action, "_use_hardware", False)
+    events = []
+    if isinstance(action, Key):
+        for event_data in _parse(action, data):
+            events.extend(action._calc_events_single(event_data, hardware))
+    else:
+        for symbol in _parse(action, data):
+            typeable = action._get_typeable(symbol, hardware)
+            if typeable is None:
+                raise ActionError("Keyboard interface cannot type this"
+                                  " character: %r" % symbol)
+            events.extend(typeable.events(action._pause))
+    return events
+
+
+def _flatten(action, data=None):
+    """Return *action* as a list of ``(action, data)`` Key/Text parts.
+
+    Return None if *action* contains anything that cannot be batched.
+    """
+    if isinstance(action, BoundAction):
+        return _flatten(action._action, action._data)
+    if isinstance(action, Keystrokes):
+        parts = []
+        for part, bound in action._parts:
+            parts.extend(_flatten(part, data if bound is None else bound))
+        return parts
+    if type(action) is ActionSeries:
+        parts = []
+        for child in action._actions:
+            child_parts = _flatten(child, data)
+            if child_parts is None:
+                return None
+            parts.extend(child_parts)
+        return parts
+    if isinstance(action, Replay):
+        parts = []
+        for child in action._actions:
+            child_parts = _flatten(child, data)
+            if child_parts is None:
+                return None
+            parts.extend(child_parts)
+        return parts * action._times
+    if isinstance(action, Key):
+        return [(action, data)]
+    if isinstance(action, Text) and not getattr(action, "_autofmt", False):
+        return [(action, data)]
+    return None
+
+
+def compile_action(action):
+    """Return a Keystrokes equivalent of *action*, or *action* itself if
+    it cannot be batched.
+
+    Even a single static Key is compiled: its events are then cached for
+    the batches it is part of.
+    """
+    parts = _flatten(action)
+    if parts is None:
+        return action
+    return Keystrokes(parts)
+
+
+def compile_mapping(mapping):
+    """Return a copy of *mapping* with every action run through
+    compile_action()."""
+    result = {}
+    for spec, value in mapping.items():
+        if isinstance(value, ActionBase):
+            value = compile_action(value)
+        result[spec] = value
+    return result
+
+
+# Key actions left over once their first key is dropped, by spec and key.
+_rests = {}
+# Actions without their first keystroke, by action and key.
+_stripped = {}
+
+
+def starts_with(action, key):
+    """Return True if the first keystroke *action* sends is *key*, e.g.
+    "escape"."""
+    parts = _flatten(action)
+    if not parts or not isinstance(parts[0][0], Key):
+        return False
+    return parts[0][0]._spec.split(",")[0].strip() == key
+
+
+def sends_only(action, key):
+    """Return True if *action* sends the keystroke *key* and nothing
+    else."""
+    parts = _flatten(action)
+    return bool(parts) and len(parts) == 1 and isinstance(
+        parts[0][0], Key) and parts[0][0]._spec.strip() == key
+
+
+def without_first(action, key):
+    """Return *action*, already bound, without its first keystroke if that
+    is *key*; otherwise return *action* itself.
+
+    The Keystrokes without the keystroke is made once per action, so that
+    its events are cached like those of the action.
+    """
+    if not starts_with(action, key):
+        return action
+    data = None
+    if isinstance(action, BoundAction):
+        action, data = action._action, action._data
+    stripped = _stripped.get((action, key))
+    if stripped is None:
+        parts = _flatten(action)
+        first, bound = parts[0]
+        rest = _rests.get((first._spec, key))
+        if rest is None:
+            names = first._spec.split(",")[1:]
+            rest = _rests[first._spec, key] = (
+                Key(",".join(names).strip()) if names else False)
+        parts = parts[1:]
+        if rest:
+            parts.insert(0, (rest, bound))
+        stripped = _stripped[action, key] = Keystrokes(parts)
+    return stripped if data is None else stripped.bind(data)
+
+
+def batch(actions, paste=None):
+    """Combine already bound *actions* into one action.
+
+    If all of them are made of Key and Text actions they are sent as one
+    Keystrokes buffer, pasting long texts with *paste* if given, otherwise
+    they run one after another. The events of Keystrokes actions come
+    from their own cache.
+    """
+    parts = []
+    for action in actions:
+        data = None
+        if isinstance(action, BoundAction):
+            action, data = action._action, action._data
+        if isinstance(action, Keystrokes):
+            parts.append((action, data))
+            continue
+        action_parts = _flatten(action, data)
+        if action_parts is None:
+            return ActionSeries(*actions)
+        parts.extend(action_parts)
+    return Keystrokes(parts, paste=paste)
+
+
+class Replay(ActionBase):
+    """Already bound *actions*, sent again *times* times in a row.
+
+    The events of Keystrokes actions come from their cache, so nothing
+    is interpolated or parsed again, and consecutive events go out in one
+    call. Other actions are executed again in between.
+    """
+
+    def __init__(self, actions, times=1):
+        ActionBase.__init__(self)
+        self._actions = list(actions)
+        self._times = times
+        self._str = "%s x %d" % (" + ".join("%s" % action
+                                            for action in self._actions),
+                                 times)
+
+    def _execute(self, data=None):
+        sequence = []
+        for action in self._actions:
+            if isinstance(action, Keystrokes):
+                sequence.extend((action, segment)
+                                for segment in action.segments())
+            else:
+                sequence.append((action, None))
+        events = []
+        for _ in range(self._times):
+            for action, segment in sequence:
+                if isinstance(segment, list):
+                    events.extend(segment)
+                    continue
+                if events:
+                    Key._keyboard.send_keyboard_events(events)
+                    events = []
+                if segment is None:
+                    action.execute()
+                else:
+                    action.send([segment])
+        if events:
+            Key._keyboard.send_keyboard_events(events)
+        return True
+
+
+def specialize(action):
+    """Return the ``(action type, spec)`` parts *action*, already bound,
+    sends, with the extras interpolated into the specs.
+
+    Return None if *action* cannot be batched.
+    """
+    parts = _flatten(action)
+    if parts is None:
+        return None
+    return [("Key" if isinstance(part, Key) else "Text",
+             _interpolate(part, data)) for part, data in parts]
+
+
+def render(action):
+    """Return the Key and Text specs *action* sends, e.g. "escape|3|d, w".
+
+    Actions that cannot be batched are rendered with str().
+    """
+    parts = _flatten(action)
+    if parts is None:
+        return "%s" % action
+    specs = []
+    for part, data in parts:
+        spec = part._spec
+        if not part._static and data:
+            try:
+                spec = spec % data
+            except (KeyError, TypeError, ValueError):
+                pass
+        specs.append(spec)
+    return "|".join(specs)
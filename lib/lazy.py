@@ -0,0 +1,119 @@
+"""Build and load a grammar only once its window is first in the foreground.
+
+A grammar module normally builds its Grammar and calls load() at import, so
+every grammar is compiled and sent to the engine when the macro system
+starts. A LazyGrammar only registers its context; the grammar is built
+and loaded at the start of the first utterance spoken while the context
+matches. With an *idle_timeout* (in seconds) it is unloaded again once its
+context has not matched for that long, and rebuilt when it matches again:
+
+    def build_rules():
+        return [Identifiers(), ContinuousCommandRule(rules)]
+
+    grammar = LazyGrammar("emacs", AppContext(title="emacs"), build_rules)
+
+The start of every utterance is observed by a single, always loaded
+LoaderGrammar that cannot recognize anything itself. Contexts are matched
+through the shared lib.contexts dispatcher, so the loader and the loaded
+grammar do not both evaluate them for the same window.
+"""
+
+import time
+
+from dragonfly import Grammar, Impossible, Rule
+
+from lib.contexts import dispatcher
+
+
+class LazyGrammar(object):
+
+    def __init__(self, name, context, build_rules, idle_timeout=None):
+        self.name = name
+        self.context = dispatcher().register(context)
+        self.idle_timeout = idle_timeout
+        self._build_rules = build_rules
+        self._grammar = None
+        self._last_active = None
+        loader().add(self)
+
+    @property
+    def grammar(self):
+        """The loaded dragonfly Grammar, or None if not loaded."""
+        return self._grammar
+
+    @property
+    def loaded(self):
+        return self._grammar is not None
+
+    def load(self):
+        """Build and load the grammar now, if it is not loaded already."""
+        if self._grammar is None:
+            grammar = Grammar(self.name, context=self.context)
+            for rule in self._build_rules():
+                grammar.add_rule(rule)
+            grammar.load()
+            self._grammar = grammar
+        self._last_active = time.time()
+
+    def unload(self):
+        """Unload the grammar; it is rebuilt when its context matches."""
+        if self._grammar is not None:
+            self._grammar.unload()
+        self._grammar = None
+
+    def close(self):
+        """Unload the grammar for good, e.g. from a module's unload()."""
+        loader().remove(self)
+        dispatcher().unregister(self.context)
+
+    def check(self, executable, title, handle, now=None):
+        """Load or idle-unload the grammar for the current window."""
+        now = time.time() if now is None else now
+        if self.context.matches(executable, title, handle):
+            self.load()
+            self._last_active = now
+        elif (self._grammar is not None and self.idle_timeout is not None
+              and now - self._last_active > self.idle_timeout):
+            self.unload()
+
+
+class LoaderGrammar(Grammar):
+    """Grammar that only watches the start of utterances for LazyGrammar."""
+
+    def __init__(self):
+        Grammar.__init__(self, "lazy loader")
+        self.add_rule(Rule(name="never", element=Impossible(),
+                           exported=True))
+        self._lazy = []
+        # Callables run at the start of every utterance, before the lazy
+        #  grammars are checked (see lib.hotreload).
+        self.on_begin = []
+
+    def add(self, lazy):
+        self._lazy.append(lazy)
+        if not self.loaded:
+            self.load()
+
+    def remove(self, lazy):
+        lazy.unload()
+        if lazy in self._lazy:
+            self._lazy.remove(lazy)
+        if not self._lazy:
+            self.unload()
+
+    def _process_begin(self, executable, title, handle):
+        for callback in self.on_begin:
+            callback()
+        for lazy in list(self._lazy):
+            lazy.check(executable, title, handle)
+
+
+_loader = None
+
+
+def loader():
+    """Return the LoaderGrammar shared by every LazyGrammar."""
+    global _loader
+    if _loader is None:
+        _loader = LoaderGrammar()
+    return _loader
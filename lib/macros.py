@@ -0,0 +1,219 @@
+"""Spoken macros, recorded once and played back as one batch.
+
+    start recording <name>
+    ... commands ...
+    stop recording
+    play macro <name>
+    forget macro <name>
+
+A name is one to three spelling words of base.ini ("sierra two", see
+lib.spelling), a closed vocabulary: a free dictation would add a
+dictation slot to the grammar of every MacroRule.
+
+While recording, the Recorder follows lib.history: every action the
+grammar that started the recording runs is kept, repeats included, with
+its extras already bound. Stopping the recording flattens them into a
+single list of Key and Text specs with the extras interpolated, the same
+plain ``(action type, spec)`` parts lib.definitions reads from the data
+files, and stores them in ``path`` as JSON under the grammar's name and
+the macro's name. The grammar's name stands for its context: a macro
+recorded in emacs is only offered in emacs.
+
+A stored macro is built into one Keystrokes action of static parts the
+first time it is played, so every later playback sends the cached
+keyboard events in one call, with no recognition of the original
+commands. Actions that cannot be batched (none of the grammars' own
+commands) are not recorded.
+"""
+
+import json
+import logging
+import os
+
+from dragonfly import (Choice, CompoundRule, DictList, DictListRef, Key,
+                       Repetition, Text)
+
+from lib import paste, timing, trace
+from lib.execution import run
+from lib.history import history
+from lib.keystrokes import Keystrokes, specialize
+from lib.spelling import spelling_table
+
+
+path = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), ".macros.json")
+
+_action_types = {"Key": Key, "Text": Text}
+
+
+class MacroStore(object):
+    """The macros of ``path``, as {grammar: {name: parts}}."""
+
+    _log = logging.getLogger("macros")
+
+    def __init__(self):
+        self._macros = None
+        # Built actions, by (grammar, name).
+        self._actions = {}
+
+    def _load(self):
+        if self._macros is None:
+            self._macros = {}
+            try:
+                with open(path) as f:
+                    self._macros = json.load(f)
+            except (IOError, OSError, ValueError):
+                pass
+        return self._macros
+
+    def names(self, grammar):
+        return sorted(self._load().get(grammar, {}))
+
+    def save(self, grammar, name, parts):
+        self._load().setdefault(grammar, {})[name] = parts
+        self._actions.pop((grammar, name), None)
+        self._write()
+
+    def remove(self, grammar, name):
+        self._load().get(grammar, {}).pop(name, None)
+        self._actions.pop((grammar, name), None)
+        self._write()
+
+    def _write(self):
+        try:
+            with open(path + ".tmp", "w") as f:
+                json.dump(self._macros, f, separators=(",", ":"),
+                          sort_keys=True)
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(path + ".tmp", path)
+        except (IOError, OSError) as e:
+            self._log.warning("Could not write %s: %s", path, e)
+
+    def action(self, grammar, name):
+        """Return the action of a stored macro, or None."""
+        key = (grammar, name)
+        action = self._actions.get(key)
+        if action is None:
+            parts = self._load().get(grammar, {}).get(name)
+            if parts is None:
+                return None
+            action = self._actions[key] = Keystrokes(
+                [(_action_types[kind](spec, static=True), None)
+                 for kind, spec in parts],
+                paste=paste.for_grammar(grammar))
+        return action
+
+
+class Recorder(object):
+    """Keeps the actions run in one grammar while a macro is recorded."""
+
+    _log = logging.getLogger("macros")
+
+    def __init__(self):
+        self.name = None
+        self.grammar = None
+        self._actions = []
+
+    @property
+    def recording(self):
+        return self.name is not None
+
+    def start(self, grammar, name):
+        self.name, self.grammar, self._actions = name, grammar, []
+        if self._add not in history().on_add:
+            history().on_add.append(self._add)
+
+    def _add(self, grammar, action):
+        if self.recording and grammar == self.grammar:
+            self._actions.append(action)
+
+    def stop(self):
+        """Stop recording; return (grammar, name, parts), or None if
+        nothing was recorded."""
+        name, grammar, actions = self.name, self.grammar, self._actions
+        self.name, self.grammar, self._actions = None, None, []
+        parts = []
+        for action in actions:
+            action_parts = specialize(action)
+            if action_parts is None:
+                self._log.warning("%s: cannot record %s", name, action)
+                continue
+            parts.extend(action_parts)
+        if name is None or not parts:
+            return None
+        return grammar, name, parts
+
+
+_store = None
+_recorder = None
+
+
+def store():
+    """Return the MacroStore shared by every grammar."""
+    global _store
+    if _store is None:
+        _store = MacroStore()
+    return _store
+
+
+def recorder():
+    """Return the Recorder shared by every grammar."""
+    global _recorder
+    if _recorder is None:
+        _recorder = Recorder()
+    return _recorder
+
+
+@timing.instrument
+class MacroRule(CompoundRule):
+    """Record, play and forget the macros of its grammar.
+
+    The mode a lib.modes.ModeTracker given as *tracker* follows is unknown
+    after a macro is played.
+    """
+
+    spec = ("(start recording <name> | stop recording"
+            " | (play | forget) macro <macro>)")
+
+    def __init__(self, grammar_name, tracker=None):
+        self._tracker = tracker
+        self._macros = DictList("macros")
+        for name in store().names(grammar_name):
+            self._macros[name] = name
+        words = dict((word, word) for word in spelling_table())
+        extras = [Repetition(Choice(None, words), min=1, max=4, name="name"),
+                  DictListRef("macro", self._macros)]
+        CompoundRule.__init__(self, extras=extras)
+
+    def _process_recognition(self, node, extras):
+        words = node.words()
+        grammar = self.grammar.name
+        if "name" in extras:
+            name = " ".join(extras["name"])
+            recorder().start(grammar, name)
+            trace.record(grammar, self.name, "start recording <name>",
+                         "name=%s" % name, "")
+        elif words[0] == "stop":
+            recorded = recorder().stop()
+            if recorded is not None:
+                store().save(*recorded)
+                # Another grammar's rule offers it once rebuilt.
+                if recorded[0] == grammar:
+                    self._macros[recorded[1]] = recorded[1]
+            trace.record(grammar, self.name, "stop recording", "",
+                         "" if recorded is None else "%d parts"
+                         % len(recorded[2]))
+        elif words[0] == "forget":
+            store().remove(grammar, extras["macro"])
+            self._macros.pop(extras["macro"], None)
+            trace.record(grammar, self.name, "forget macro <macro>",
+                         "macro=%s" % extras["macro"], "")
+        else:
+            action = store().action(grammar, extras["macro"])
+            if action is None:
+                return
+            run(self, "play macro <macro>", action,
+                "macro=%s" % extras["macro"])
+            if self._tracker is not None:
+                self._tracker.set(None)
@@ -0,0 +1,164 @@
+"""Scope an editor grammar's commands to the mode the editor is in.
+
+With evil, emacs is in normal, insert or visual mode, and most commands
+only make sense in one of them: typing "alpha" in normal mode is an
+editing command, "join lines" in insert mode types a "J". The data file
+of the grammar says which mode each command belongs to and which mode it
+leaves the editor in (see lib.definitions), and a ModeTracker follows
+along:
+
+    tracker = modes.ModeTracker("emacs", initial="normal")
+    rules = modes.mode_rules("emacs", "emacs", mapping)
+
+    def build_rules():
+        return [Identifiers(), CancelRule()] + tracker.chain_rules(rules)
+
+There is one ContinuousCommandRule per mode, over the commands of every
+mode and those of that mode, and only the one of the tracked mode is
+enabled, so the engine searches a fraction of the grammar. After each
+recognition the tracker works out the mode the commands left the editor
+in:
+
+ - the resulting mode given in the data file, if any,
+ - otherwise the mode of the command's own section,
+ - otherwise normal mode if the command starts with an escape,
+ - otherwise the mode does not change.
+
+A grammar can have several sets of chains, e.g. one over its rare
+commands (see lib.usage), each with its own name in chain_rules();
+switch() turns a set off and on again, whatever the mode.
+
+While the editor is known to be in normal mode, the leading escape of the
+commands is dropped, except from the commands that set the mode: "escape"
+itself and those with a resulting mode ("insert"). lib.history and
+lib.macros keep the commands with their escapes, and RepeatRule and
+MacroRule given the tracker set the mode to None after sending them
+again. A tracked mode of None means unknown: every chain is enabled, as
+before modes were tracked. If
+the tracker is wrong (e.g. a mode changed with the keyboard), saying any
+command that sets the mode brings it back in step, as it still sends its
+escape.
+
+The tracker reads the scopes once; lib.hotreload calls reload() once the
+data file has been reloaded:
+
+    hotreload.reloader().watch("emacs", rules, grammar,
+                               on_reload=tracker.reload)
+"""
+
+import logging
+
+from lib import definitions
+from lib.chaining import ContinuousCommandRule
+from lib.keystrokes import sends_only, starts_with, without_first
+from lib.vocabulary import CommandRule
+
+
+# Modes with their own commands and chain rule.
+modes = ("normal", "insert", "visual")
+
+
+def mode_rules(name, definition, mapping, exclude=(), only=None):
+    """Return {mode: CommandRule} over the commands of *mapping* scoped to
+    each mode of ``modes``, and under None those of every mode.
+
+    The scopes are read from ``<definition>.ini`` each time a rule is
+    built, so that they follow lib.hotreload; specs in *exclude* are left
+    out and, with *only*, so are the specs not in *only*.
+    """
+    def select(mode):
+        return lambda spec: (spec not in exclude
+                             and (only is None or spec in only)
+                             and definitions.modes(definition).get(
+                                 spec, (None, None))[0] == mode)
+    rules = {None: CommandRule(name=name, mapping=mapping, exported=False,
+                               select=select(None))}
+    for mode in modes:
+        rules[mode] = CommandRule(name="%s %s" % (name, mode),
+                                  mapping=mapping, exported=False,
+                                  select=select(mode))
+    return rules
+
+
+def _enable(rule, enabled):
+    if rule._grammar is None:
+        rule._enabled = enabled
+    elif enabled:
+        rule.enable()
+    else:
+        rule.disable()
+
+
+class ModeTracker(object):
+    """Tracks the mode of an editor from the commands of
+    ``<definition>.ini`` spoken in it, starting in *initial* (None for
+    unknown)."""
+
+    _log = logging.getLogger("modes")
+
+    def __init__(self, definition, initial=None):
+        self.definition = definition
+        self.mode = initial
+        self.scopes = definitions.modes(definition)
+        # {(name, mode): chain rule}, and the names switched off.
+        self._chains = {}
+        self._off = set()
+
+    def reload(self):
+        """Read the scopes of the data file again."""
+        self.scopes = definitions.modes(self.definition)
+
+    def chain_rules(self, rules, max=16, name="continuous"):
+        """Return a ContinuousCommandRule per mode over the CommandRules
+        of mode_rules(), named "<name> <mode>" and enabled as the tracked
+        mode requires; they replace the chains of the same *name*."""
+        for key in [key for key in self._chains if key[0] == name]:
+            del self._chains[key]
+        chains = []
+        for mode in modes:
+            commands = [rule for rule in (rules[None], rules[mode])
+                        if rule.element is not None]
+            if commands:
+                chain = self._chains[(name, mode)] = ContinuousCommandRule(
+                    commands, max=max, name="%s %s" % (name, mode),
+                    tracker=self)
+                chains.append(chain)
+        self.set(self.mode)
+        return chains
+
+    def switch(self, name, on):
+        """Switch the chains of chain_rules() *name* on or off; those
+        switched on are still only enabled in their mode."""
+        if on:
+            self._off.discard(name)
+        else:
+            self._off.add(name)
+        self.set(self.mode)
+
+    def set(self, mode):
+        """Track *mode* from now on; the chains of the other modes are
+        disabled from the next utterance."""
+        if mode != self.mode:
+            self._log.debug("Mode: %s -> %s", self.mode, mode)
+        self.mode = mode
+        for (name, chain_mode), chain in self._chains.items():
+            _enable(chain, name not in self._off
+                    and (mode is None or chain_mode == mode))
+
+    def process(self, specs, actions):
+        """Return the bound *actions* of the commands *specs*, spoken in
+        that order, without their redundant escapes; track the mode they
+        leave the editor in."""
+        scopes = self.scopes
+        mode = self.mode
+        result = []
+        for spec, action in zip(specs, actions):
+            escape = starts_with(action, "escape")
+            scope, after = scopes.get(spec, (None, None))
+            if (escape and mode == "normal" and after is None
+                    and not sends_only(action, "escape")):
+                action = without_first(action, "escape")
+            mode = after or scope or ("normal" if escape else mode)
+            result.append(action)
+        self.set(mode)
+        return result
@@ -0,0 +1,42 @@
+"""Compact number element for counts such as "kill [<n>] word".
+
+``Integer("n", 1, 20000)`` expands into a large compositional number
+grammar ("twenty three thousand ...") in every rule that uses it. Digits
+only needs the ten digit words: numbers are spoken digit by digit, so
+"go to line one two five" gives 125. A number cannot start with "zero":
+like the ``Integer`` it replaces, its value is at least 1 (a count of 0
+would send evil's "0" motion instead).
+"""
+
+from dragonfly import Choice, Optional, Repetition, Sequence
+
+
+digit_words = {
+    "zero": "0",
+    "one": "1",
+    "two": "2",
+    "three": "3",
+    "four": "4",
+    "five": "5",
+    "six": "6",
+    "seven": "7",
+    "eight": "8",
+    "nine": "9",
+}
+
+
+class Digits(Sequence):
+    """A number spoken as up to *max_digits* digit words, the first one
+    not "zero"; its value is an int."""
+
+    def __init__(self, name, max_digits=5, default=None):
+        children = [Choice(None, dict((word, digit) for word, digit
+                                      in digit_words.items()
+                                      if digit != "0"))]
+        if max_digits > 1:
+            children.append(Optional(Repetition(
+                Choice(None, digit_words), min=1, max=max_digits)))
+        Sequence.__init__(self, children, name=name, default=default)
+
+    def value(self, node):
+        return int("".join(digit_words[word] for word in node.words()))
@@ -0,0 +1,69 @@
+"""Paste long text through the clipboard instead of typing it.
+
+Text types one character at a time, so a long path or a long dictated
+sentence takes seconds to appear. Keystrokes built with a ClipboardPaste
+send any Text longer than its threshold by saving the clipboard, putting
+the text on it, pressing the paste key and restoring the saved contents:
+a single keystroke whatever the length.
+
+Applications do not all paste the same way, so the threshold and the
+paste key can be overridden per grammar:
+
+    paste.configure("emacs", key="s-insert")
+    paste.configure("command prompt", threshold=None)  # always type
+
+for_grammar() returns the strategy a grammar's rules should use.
+"""
+
+import time
+
+from dragonfly import Clipboard, Key
+
+
+class ClipboardPaste(object):
+    """Paste texts of at least *threshold* characters with *key*."""
+
+    # The clipboard class used; benchmarks.stub replaces it.
+    clipboard = Clipboard
+
+    # Seconds to leave the text on the clipboard, as the application
+    #  reads it after the paste key is pressed.
+    restore_delay = 0.05
+
+    def __init__(self, threshold=48, key="c-v"):
+        self.threshold = threshold
+        self.key = key
+        self._key_action = Key(key)
+
+    def wants(self, text):
+        """Return True if *text* should be pasted rather than typed."""
+        return self.threshold is not None and len(text) >= self.threshold
+
+    def send(self, text):
+        saved = self.clipboard(from_system=True)
+        self.clipboard.set_system_text(text)
+        self._key_action.execute()
+        if self.restore_delay:
+            time.sleep(self.restore_delay)
+        saved.copy_to_system()
+
+    def __repr__(self):
+        return "ClipboardPaste(%r, %r)" % (self.threshold, self.key)
+
+
+default = ClipboardPaste()
+
+_overrides = {}
+
+
+def configure(grammar, threshold=default.threshold, key=default.key):
+    """Use a different threshold or paste key in *grammar*'s context.
+
+    A threshold of None disables pasting there.
+    """
+    _overrides[grammar] = ClipboardPaste(threshold, key)
+
+
+def for_grammar(grammar):
+    """Return the ClipboardPaste for the grammar named *grammar*."""
+    return _overrides.get(grammar, default)
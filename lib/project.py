@@ -0,0 +1,318 @@
+"""Identifiers that already exist in the project being worked on.
+
+"variable user name" formats to ``userName``, even when the code already
+says ``username`` or ``user_name``. An IdentifierIndex scans a source tree
+for the identifiers it uses (Python files with ast, other text files by
+tokenizing them) and lib.identifiers prefers an existing identifier made
+of the dictated words:
+
+ - every identifier is filed under its words, lowercased and joined:
+   ``user_name``, ``userName`` and ``USERNAME`` all become "username",
+ - a dictated phrase looks its joined words up; among the identifiers
+   filed there, the one written the way the naming style asks wins, then
+   the one with the same separators and case, then the most used one,
+ - only if ``fuzzy`` is set, without an exact match, the identifiers
+   whose trigrams are similar enough (``min_similarity``) are considered
+   the same way, so that "load config" finds ``loadConfigs``. It is off by
+   default: a similar identifier is usually another name ("user names" is
+   not ``user_name``), which would be typed silently instead of the one
+   dictated. Trigrams shared by more than ``max_postings`` identifiers are
+   too common to tell them apart and are not indexed.
+
+An exact lookup is a dict access. A near one only reads the postings of
+the rarest trigrams of the phrase, since a key similar enough must share
+one of them, and checks the keys of about the right length found there.
+With a hundred thousand identifiers, exact lookups take a few
+microseconds and near ones a few hundred at most (see
+benchmarks/project_index.py).
+
+The tree indexed is ``root``, by default the DRAGONFLY_PROJECT environment
+variable; nothing is indexed without one. It is scanned on a background
+thread the first time an identifier is dictated, and kept up to date file
+by file with a recursive lib.watcher.DirectoryWatcher.
+"""
+
+import ast
+import logging
+import math
+import os
+import re
+import threading
+
+from lib.watcher import DirectoryWatcher
+
+
+root = os.environ.get("DRAGONFLY_PROJECT")
+
+# Files tokenized for identifiers, besides Python files.
+text_extensions = set([
+    ".c", ".cc", ".cpp", ".cs", ".css", ".go", ".h", ".hpp", ".html",
+    ".java", ".js", ".jsx", ".kt", ".lua", ".php", ".pl", ".rb", ".rs",
+    ".scala", ".sh", ".sql", ".swift", ".ts", ".tsx",
+])
+ignored_directories = set(["__pycache__", "build", "dist", "node_modules",
+                           "venv"])
+max_file_size = 1 << 20
+
+min_length = 3
+fuzzy = False
+min_similarity = 0.7
+max_postings = 200
+
+_token_pattern = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+# Word boundaries inside an identifier: separators and case changes.
+_word_pattern = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+
+
+def key_of(identifier):
+    """Return the key *identifier* is filed under, e.g. "username" for
+    ``userName``."""
+    return "".join(_word_pattern.findall(identifier)).lower()
+
+
+def _shape(identifier):
+    return ("_" in identifier, "-" in identifier, identifier.isupper(),
+            identifier[:1].isupper())
+
+
+def trigrams(key):
+    padded = " %s " % key
+    return set(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def python_identifiers(source):
+    """Return the identifiers defined or used in the Python *source*."""
+    names = []
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Name):
+            names.append(node.id)
+        elif isinstance(node, ast.Attribute):
+            names.append(node.attr)
+        elif isinstance(node, (ast.FunctionDef, ast.ClassDef)) or (
+                type(node).__name__ == "AsyncFunctionDef"):
+            names.append(node.name)
+        elif type(node).__name__ == "arg":
+            names.append(node.arg)
+        elif isinstance(node, ast.keyword) and node.arg:
+            names.append(node.arg)
+        elif isinstance(node, ast.alias):
+            names.extend(node.name.split("."))
+            if node.asname:
+                names.append(node.asname)
+    return names
+
+
+def text_identifiers(source):
+    """Return the identifier-like tokens of *source*."""
+    return _token_pattern.findall(source)
+
+
+def identifiers_of(path):
+    """Return the identifiers of the file *path*, or [] if it is not
+    indexed."""
+    extension = os.path.splitext(path)[1]
+    if extension != ".py" and extension not in text_extensions:
+        return []
+    try:
+        if os.path.getsize(path) > max_file_size:
+            return []
+        with open(path, "rb") as f:
+            source = f.read().decode("utf-8", "replace")
+    except (IOError, OSError):
+        return []
+    if extension == ".py":
+        try:
+            return python_identifiers(source)
+        except (SyntaxError, ValueError):
+            pass
+    return text_identifiers(source)
+
+
+class IdentifierIndex(object):
+    """The identifiers of the files under *root*, by key and trigram."""
+
+    _log = logging.getLogger("project")
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        # {path: {identifier: count}}, for incremental updates.
+        self._files = {}
+        self._counts = {}
+        self._by_key = {}
+        self._by_trigram = {}
+        self._watcher = None
+
+    def __len__(self):
+        return len(self._counts)
+
+    def scan(self):
+        """Index every file of the tree."""
+        for path, names, files in os.walk(self.root):
+            names[:] = [name for name in names if not name.startswith(".")
+                        and name not in ignored_directories]
+            for name in files:
+                self.update(os.path.join(path, name))
+        self._log.info("Indexed %d identifiers under %s", len(self),
+                       self.root)
+
+    def start(self):
+        """Scan the tree on a background thread, then follow its
+        changes."""
+        thread = threading.Thread(target=self._start, name="project index")
+        thread.daemon = True
+        thread.start()
+
+    def _start(self):
+        self._watcher = DirectoryWatcher(self.root, self._changed,
+                                         recursive=True)
+        try:
+            self._watcher.start()
+        except (ImportError, OSError) as e:
+            self._log.warning("The index of %s will not follow changes: %s",
+                              self.root, e)
+        self.scan()
+
+    def stop(self):
+        if self._watcher is not None:
+            self._watcher.stop()
+
+    def _changed(self, name):
+        parts = name.split(os.sep)
+        if [True for part in parts[:-1]
+                if part.startswith(".") or part in ignored_directories]:
+            return
+        self.update(os.path.join(self.root, name))
+
+    def update(self, path):
+        """Index the identifiers of *path* again, e.g. after it changed
+        or was removed."""
+        counts = {}
+        if os.path.isfile(path):
+            for identifier in identifiers_of(path):
+                if len(identifier) >= min_length:
+                    counts[identifier] = counts.get(identifier, 0) + 1
+        with self._lock:
+            for identifier, count in self._files.pop(path, {}).items():
+                self._add(identifier, -count)
+            for identifier, count in counts.items():
+                self._add(identifier, count)
+            if counts:
+                self._files[path] = counts
+
+    def add(self, identifier, count=1):
+        """Index *identifier* without a file, e.g. for a benchmark."""
+        with self._lock:
+            self._add(identifier, count)
+
+    def _add(self, identifier, count):
+        total = self._counts.get(identifier, 0) + count
+        if total > 0:
+            if identifier not in self._counts:
+                self._file(identifier)
+            self._counts[identifier] = total
+        elif identifier in self._counts:
+            del self._counts[identifier]
+            self._unfile(identifier)
+
+    def _file(self, identifier):
+        key = key_of(identifier)
+        if not key:
+            return
+        filed = self._by_key.get(key)
+        if filed is None:
+            filed = self._by_key[key] = set()
+            for trigram in trigrams(key):
+                postings = self._by_trigram.setdefault(trigram, set())
+                if postings is not None:
+                    postings.add(key)
+                    if len(postings) > max_postings:
+                        self._by_trigram[trigram] = None
+        filed.add(identifier)
+
+    def _unfile(self, identifier):
+        key = key_of(identifier)
+        filed = self._by_key.get(key)
+        if filed is None:
+            return
+        filed.discard(identifier)
+        if not filed:
+            del self._by_key[key]
+            for trigram in trigrams(key):
+                postings = self._by_trigram.get(trigram)
+                if postings:
+                    postings.discard(key)
+
+    def lookup(self, words, preferred):
+        """Return the existing identifier for the dictated *words*, the
+        one spelled *preferred* or shaped like it if possible, or None."""
+        key = "".join(words.split()).lower()
+        if not key:
+            return None
+        with self._lock:
+            candidates = self._by_key.get(key)
+            if not candidates and fuzzy:
+                candidates = self._similar(key)
+            if not candidates:
+                return None
+            if preferred in candidates:
+                return preferred
+            counts = self._counts
+            shape = _shape(preferred)
+            return max(candidates, key=lambda identifier: (
+                len([True for a, b in zip(_shape(identifier), shape)
+                     if a == b]),
+                counts.get(identifier, 0), identifier))
+
+    def _similar(self, key):
+        """Return the identifiers of the key whose trigrams are the most
+        similar to those of *key*, by Jaccard index, if enough."""
+        wanted = trigrams(key)
+        # A key similar enough shares at least one of the rarest trigrams
+        #  of *key* (prefix filtering): only their postings are read.
+        needed = int(math.ceil(min_similarity * len(wanted)))
+        postings = sorted((self._by_trigram.get(trigram)
+                           for trigram in wanted), key=lambda postings:
+                          len(postings) if postings else max_postings + 1)
+        candidates = set()
+        for keys in postings[:len(wanted) - needed + 1]:
+            candidates.update(keys or ())
+        # A key has about as many trigrams as letters: it cannot reach
+        #  min_similarity unless the lengths are close enough.
+        low = min_similarity * len(wanted) - 1
+        high = len(wanted) / min_similarity + 1
+        best, best_score = None, min_similarity
+        for other in candidates:
+            if not low <= len(other) <= high:
+                continue
+            padded = " %s " % other
+            shared = len([True for trigram in wanted if trigram in padded])
+            score = float(shared) / (len(wanted) + len(other) - shared)
+            if score >= best_score:
+                best, best_score = other, score
+        return self._by_key.get(best, ()) if best is not None else ()
+
+
+_index = None
+_started = False
+
+
+def index():
+    """Return the IdentifierIndex of ``root``, started on first use, or
+    None without a root."""
+    global _index, _started
+    if _index is None and root:
+        _index = IdentifierIndex(root)
+    if _index is not None and not _started:
+        _started = True
+        _index.start()
+    return _index
+
+
+def snap(words, formatted):
+    """Return the existing identifier of the project for the dictated
+    *words*, preferring *formatted*, or *formatted* itself."""
+    project = index()
+    if project is None:
+        return formatted
+    return project.lookup(words, formatted) or formatted
@@ -0,0 +1,130 @@
+"""Put the grammars to sleep and wake them up, on any engine.
+
+While asleep, every loaded grammar but the one holding the wake rule is
+disabled, the LoaderGrammar of lib.lazy included, so nothing else is
+loaded meanwhile. Background speech is then only matched against the
+wake rule instead of firing commands. Waking enables exactly the grammars
+that were enabled before; dragonfly activates their rules again at the
+start of the next utterance, according to their contexts:
+
+    sleeper().sleep(grammar)    # grammar of the "snore" rule stays active
+    sleeper().wake()
+
+The engine's own microphone is put to sleep as well where it has one (see
+microphone_for()). With Dragon, its own "wake up" switches the microphone
+back on; a SleepGrammar notices at the start of the next utterance and
+wakes the grammars too, so they may miss that first utterance.
+"""
+
+import logging
+
+from dragonfly import Grammar, get_engine
+
+
+class Microphone(object):
+    """The microphone of an engine without a sleep state: sleeping only
+    disables the grammars."""
+
+    def sleep(self):
+        pass
+
+    def wake(self):
+        pass
+
+    def sleeping(self):
+        """Return whether the microphone sleeps, or None if unknown."""
+        return None
+
+
+class NatlinkMicrophone(Microphone):
+    """Dragon's microphone, through natlink."""
+
+    def __init__(self):
+        import natlink
+        self._natlink = natlink
+
+    def sleep(self):
+        self._natlink.setMicState("sleeping")
+
+    def wake(self):
+        self._natlink.setMicState("on")
+
+    def sleeping(self):
+        return self._natlink.getMicState() == "sleeping"
+
+
+def microphone_for(engine):
+    """Return the Microphone of the dragonfly *engine*."""
+    if engine.name == "natlink":
+        return NatlinkMicrophone()
+    return Microphone()
+
+
+class Sleeper(object):
+
+    _log = logging.getLogger("sleep")
+
+    def __init__(self, microphone=None, engine=None):
+        self._microphone = microphone
+        self._engine = engine
+        self._asleep = None
+
+    @property
+    def asleep(self):
+        return self._asleep is not None
+
+    @property
+    def microphone(self):
+        if self._microphone is None:
+            self._microphone = microphone_for(self.engine)
+        return self._microphone
+
+    @property
+    def engine(self):
+        return self._engine or get_engine()
+
+    def sleep(self, awake=None):
+        """Disable every enabled grammar but *awake* and put the microphone
+        to sleep."""
+        if self.asleep:
+            return
+        self._asleep = [grammar for grammar in self.engine.grammars
+                        if grammar is not awake and grammar.enabled]
+        for grammar in self._asleep:
+            grammar.disable()
+            for rule in grammar.rules:
+                if rule.active:
+                    rule.deactivate()
+        self.microphone.sleep()
+        self._log.info("Asleep; %d grammars disabled", len(self._asleep))
+
+    def wake(self):
+        """Enable the grammars sleep() disabled and wake the microphone."""
+        if not self.asleep:
+            return
+        grammars, self._asleep = self._asleep, None
+        for grammar in grammars:
+            grammar.enable()
+        if self.microphone.sleeping():
+            self.microphone.wake()
+        self._log.info("Awake; %d grammars enabled", len(grammars))
+
+
+_sleeper = None
+
+
+def sleeper():
+    """Return the Sleeper shared by every grammar."""
+    global _sleeper
+    if _sleeper is None:
+        _sleeper = Sleeper()
+    return _sleeper
+
+
+class SleepGrammar(Grammar):
+    """Grammar of the sleep and wake rules; wakes the grammars once the
+    engine's microphone was switched on by other means."""
+
+    def _process_begin(self, executable, title, handle):
+        if sleeper().asleep and sleeper().microphone.sleeping() is False:
+            sleeper().wake()
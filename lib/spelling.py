@@ -0,0 +1,46 @@
+"""Spell a whole word in one utterance: "spell bic delta echo fox two".
+
+Each spelling word of base.ini ("alpha", "bic alpha", "two", ...) is a
+command of its own: spelling a 12 character token through the chain rule
+binds and interpolates twelve actions. SpellRule takes a Repetition of
+those words instead and looks each one up in a table built once from
+base.ini: the commands that type a single letter or digit. The result is
+typed as a single Text, with one recognition and one send.
+"""
+
+from dragonfly import Choice, CompoundRule, Repetition, Text
+
+from lib import definitions, paste, timing
+from lib.execution import run
+from lib.keystrokes import batch
+
+
+def spelling_table(name="base"):
+    """Return {spoken words: character} for the commands of
+    ``<name>.ini`` that type a single letter or digit."""
+    table = {}
+    for spec, parts in definitions.parts(name).items():
+        if len(parts) == 1 and parts[0][0] == "Text":
+            text = parts[0][1]
+            if len(text) == 1 and text.isalnum():
+                table[spec] = text
+    return table
+
+
+@timing.instrument
+class SpellRule(CompoundRule):
+    """Type up to *max* spelled letters and digits as one text."""
+
+    spec = "spell <letters>"
+
+    def __init__(self, max=32, table=None):
+        extras = [Repetition(Choice(None, table or spelling_table()), min=1,
+                             max=max + 1, name="letters")]
+        CompoundRule.__init__(self, extras=extras)
+
+    def _process_recognition(self, node, extras):
+        start = timing.clock()
+        text = "".join(extras["letters"])
+        action = batch([Text(text)], paste.for_grammar(self.grammar.name))
+        run(self, self.spec, action, "letters=%s" % text,
+            counted=[self.spec], started=start)
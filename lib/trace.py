@@ -0,0 +1,155 @@
+"""Binary trace of recognitions and the keystrokes they emitted.
+
+Every handled recognition is packed into a fixed-size record of a
+preallocated ring buffer: time, grammar, rule, spec, extras and the
+keystroke specs that were sent. Grammar, rule and spec (a chain's specs
+joined by " + ") are stored in full, as ids of a table of the names
+recorded so far; extras and keystrokes are truncated to their field.
+Recording costs a dict lookup and a struct.pack_into() into memory
+allocated once at import, instead of formatting and writing a log line on
+the recognition thread; the last ``capacity`` recognitions are always
+available.
+
+last() returns the latest record. flush() writes the names and the
+buffer, oldest record first, to a file and decode() reads such a file
+back. To print a flushed trace:
+
+    python -m lib.trace trace.bin
+"""
+
+import struct
+import sys
+import time
+
+
+# time, grammar, rule and spec ids, extras, keystrokes
+record_struct = struct.Struct("<dIII76s160s")
+fields = ("time", "grammar", "rule", "spec", "extras", "keys")
+named_fields = ("grammar", "rule", "spec")
+
+# magic, version, record size, records, size of the names that follow
+header_struct = struct.Struct("<4sHHII")
+magic = b"DFTR"
+version = 2
+
+capacity = 1024
+
+_buffer = bytearray(capacity * record_struct.size)
+_count = 0
+# The names recorded so far, and their ids (their index in _names).
+_names = []
+_ids = {}
+
+
+def _encode(value):
+    if not isinstance(value, bytes):
+        value = ("%s" % value).encode("utf-8")
+    return value
+
+
+def _id(name):
+    result = _ids.get(name)
+    if result is None:
+        result = _ids[name] = len(_names)
+        _names.append(name)
+    return result
+
+
+def record(grammar, rule, spec, extras, keys):
+    """Add a recognition to the ring buffer, overwriting the oldest."""
+    global _count
+    offset = (_count % capacity) * record_struct.size
+    record_struct.pack_into(_buffer, offset, time.time(), _id(grammar),
+                            _id(rule), _id(spec), _encode(extras),
+                            _encode(keys))
+    _count += 1
+
+
+def format_extras(spec, data):
+    """Return the extras of *data* that *spec* refers to as "n=3 text=x"."""
+    return " ".join("%s=%s" % (name, data[name]) for name in sorted(data)
+                    if "<%s>" % name in spec)
+
+
+def _decode(values, names):
+    record = dict(zip(fields, values))
+    for name in fields[1:]:
+        if name in named_fields:
+            record[name] = names[record[name]]
+        else:
+            record[name] = record[name].rstrip(b"\0").decode("utf-8",
+                                                             "replace")
+    return record
+
+
+def last():
+    """Return the latest record as a dict, or None if there is none."""
+    if not _count:
+        return None
+    offset = ((_count - 1) % capacity) * record_struct.size
+    return _decode(record_struct.unpack_from(_buffer, offset), _names)
+
+
+def _records():
+    """Return the raw records in the buffer, oldest first."""
+    size = record_struct.size
+    if _count <= capacity:
+        return bytes(_buffer[:_count * size])
+    start = (_count % capacity) * size
+    return bytes(_buffer[start:] + _buffer[:start])
+
+
+def flush(path):
+    """Write the buffered records to *path*; return how many."""
+    records = _records()
+    count = len(records) // record_struct.size
+    names = b"\0".join(_encode(name) for name in _names)
+    with open(path, "wb") as f:
+        f.write(header_struct.pack(magic, version, record_struct.size,
+                                   count, len(names)))
+        f.write(names)
+        f.write(records)
+    return count
+
+
+def reset():
+    global _count
+    _count = 0
+    del _names[:]
+    _ids.clear()
+
+
+def decode(path):
+    """Yield the records of a flushed trace file as dicts."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:4] != magic or data[4:6] != struct.pack("<H", version):
+        raise ValueError("%s is not a version %d trace file"
+                         % (path, version))
+    _, _, size, count, names_size = header_struct.unpack_from(data, 0)
+    if size != record_struct.size:
+        raise ValueError("%s has %d byte records, expected %d"
+                         % (path, size, record_struct.size))
+    offset = header_struct.size + names_size
+    names = [name.decode("utf-8", "replace") for name in
+             data[header_struct.size:offset].split(b"\0")]
+    for _ in range(count):
+        values = record_struct.unpack_from(data, offset)
+        offset += size
+        yield _decode(values, names)
+
+
+def main(argv):
+    if len(argv) != 2:
+        print("usage: python -m lib.trace TRACE_FILE")
+        return 2
+    for record in decode(argv[1]):
+        stamp = time.strftime("%H:%M:%S", time.localtime(record["time"]))
+        print("%s %s/%s %r %s -> %s" % (stamp, record["grammar"],
+                                        record["rule"], record["spec"],
+                                        record["extras"], record["keys"]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
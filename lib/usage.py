@@ -0,0 +1,171 @@
+"""How often each command is used, and a hot/rare split of the commands.
+
+The chain rule and Identifiers count every recognized spec, and every
+naming style (as "<naming> variable"), per grammar. The counts are kept in
+memory and written to ``path`` as compact JSON once ``batch_size``
+recognitions have accumulated or ``interval`` seconds have passed since the
+last write, whichever comes first, and when a grammar module unloads. To
+print them, most used first:
+
+    python -m lib.usage [FILE]
+
+rare_specs() uses the counts to split a grammar's commands: the specs that
+together make up ``coverage`` of its recognitions stay in the main command
+rule, the others go into a secondary rule that the engine only has to
+consider while it is enabled. Until ``min_samples`` recognitions have been
+counted for a grammar, nothing is considered rare. RareCommandsRule
+switches that rule off and on again: "rare commands off".
+"""
+
+import json
+import logging
+import os
+import sys
+import time
+
+from dragonfly import CompoundRule
+
+from lib import trace
+
+
+path = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), ".usage.json")
+
+batch_size = 50
+interval = 300
+
+min_samples = 500
+coverage = 0.98
+
+_log = logging.getLogger("usage")
+
+_counts = None
+_pending = 0
+_last_write = time.time()
+
+
+def _load():
+    global _counts
+    if _counts is None:
+        _counts = {}
+        try:
+            with open(path) as f:
+                _counts = json.load(f)
+        except (IOError, OSError, ValueError):
+            pass
+    return _counts
+
+
+def count(grammar, spec):
+    """Count one recognition of *spec* in *grammar*."""
+    global _pending
+    specs = _load().setdefault(grammar, {})
+    specs[spec] = specs.get(spec, 0) + 1
+    _pending += 1
+    if _pending >= batch_size or time.time() - _last_write > interval:
+        flush()
+
+
+def flush():
+    """Write the counts to ``path`` if any are pending."""
+    global _pending, _last_write
+    if not _pending:
+        return
+    try:
+        with open(path + ".tmp", "w") as f:
+            json.dump(_counts, f, separators=(",", ":"), sort_keys=True)
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(path + ".tmp", path)
+    except (IOError, OSError) as e:
+        _log.warning("Could not write %s: %s", path, e)
+        return
+    _pending = 0
+    _last_write = time.time()
+
+
+def counts(grammar):
+    """Return the {spec: count} of *grammar*."""
+    return dict(_load().get(grammar, {}))
+
+
+def report():
+    """Return (grammar, spec, count) for every counted spec, most used
+    first."""
+    result = [(grammar, spec, number)
+              for grammar, specs in _load().items()
+              for spec, number in specs.items()]
+    result.sort(key=lambda entry: (-entry[2], entry[0], entry[1]))
+    return result
+
+
+def rare_specs(grammar, specs):
+    """Return the specs of *specs* outside the most used ones that make up
+    ``coverage`` of *grammar*'s recognitions."""
+    used = counts(grammar)
+    total = sum(used.get(spec, 0) for spec in specs)
+    if total < min_samples:
+        return set()
+    hot = set()
+    covered = 0
+    for spec in sorted(specs, key=lambda spec: -used.get(spec, 0)):
+        if covered >= coverage * total:
+            break
+        hot.add(spec)
+        covered += used.get(spec, 0)
+    return set(specs) - hot
+
+
+# Grammars whose rare commands were switched off.
+_switched_off = set()
+
+
+class RareCommandsRule(CompoundRule):
+    """Switch *rule*, the chain of the rare commands of the grammar named
+    *grammar_name*, off and on; it stays off when the grammar is
+    rebuilt.
+
+    With a lib.modes.ModeTracker *tracker*, *rule* is the name its chains
+    of the rare commands were given in chain_rules() instead.
+    """
+
+    spec = "rare commands (on | off)"
+
+    def __init__(self, grammar_name, rule, tracker=None):
+        self._grammar_name = grammar_name
+        self._rule = rule
+        self._tracker = tracker
+        if grammar_name in _switched_off:
+            self._switch(False)
+        CompoundRule.__init__(self)
+
+    def _switch(self, on):
+        if self._tracker is not None:
+            self._tracker.switch(self._rule, on)
+        elif on:
+            self._rule.enable()
+        else:
+            self._rule.disable()
+
+    def _process_recognition(self, node, extras):
+        if node.words()[-1] == "off":
+            _switched_off.add(self._grammar_name)
+            self._switch(False)
+        else:
+            _switched_off.discard(self._grammar_name)
+            self._switch(True)
+        trace.record(self.grammar.name, self.name, " ".join(node.words()),
+                     "", "")
+
+
+def main(argv):
+    global path
+    if len(argv) > 1:
+        path = argv[1]
+    for grammar, spec, number in report():
+        print("%8d  %-20s %s" % (number, grammar, spec))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
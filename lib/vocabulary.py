@@ -0,0 +1,137 @@
+"""Extras shared by every grammar and the MappingRule built on them.
+
+The commands themselves, including the spelling alphabet, digits and
+symbols every grammar shares, are declared in ``grammars/*.ini`` and
+loaded with lib.definitions:
+
+    rules = CommandRule(name="emacs", mapping=definitions.load("emacs"))
+"""
+
+from dragonfly import Dictation, MappingRule
+
+from lib import timing
+from lib.numbers import Digits
+
+
+# extras available to every mapping
+extras = [
+    Dictation("text", format=False),
+    Dictation("mark", format=False),
+    Digits("n"),
+    Digits("scroll_by"),
+]
+
+defaults = {
+    "text": "",
+    "mark": "a",
+    "n": 1,
+    "scroll_by": 1,
+}
+
+
+def used_extras(mapping, elements=extras):
+    """Return the *elements* referenced by at least one spec in *mapping*.
+
+    MappingRule looks every extra up in the parse tree on each
+    recognition, whether or not the spec can contain it.
+    """
+    return [element for element in elements
+            if [True for spec in mapping if "<%s>" % element.name in spec]]
+
+
+def takes_dictation(spec, elements=extras):
+    """Return True if *spec* refers to one of the Dictation *elements*."""
+    return bool([True for element in elements
+                 if isinstance(element, Dictation)
+                 and "<%s>" % element.name in spec])
+
+
+class CommandRule(MappingRule):
+    """MappingRule over a grammar's commands and the shared extras.
+
+    The extras default to the shared ones, pruned to those some spec of
+    *mapping* uses. With *select*, only the specs for which select(spec)
+    is true are kept, also when the rule is remapped.
+    """
+
+    def __init__(self, name=None, mapping=None, extras=extras,
+                 defaults=defaults, exported=None, context=None,
+                 select=None):
+        mapping = dict((spec, action)
+                       for spec, action in (mapping or {}).items()
+                       if select is None or select(spec))
+        self._all_extras = extras
+        self._select = select
+        self._split = None
+        MappingRule.__init__(self, name, mapping, used_extras(mapping, extras),
+                             defaults, exported, context)
+
+    def replace_action(self, spec, action):
+        """Make the existing *spec* run *action* from now on.
+
+        The specs do not change, so the grammar needs no reloading.
+        """
+        for compound in self.element.children:
+            if compound._spec == spec:
+                compound._value = action
+                self._mapping[spec] = action
+                for rule in self._split or ():
+                    if rule is not None and spec in rule._mapping:
+                        rule.replace_action(spec, action)
+                return
+        raise KeyError(spec)
+
+    def remap(self, mapping):
+        """Rebuild the rule over a new *mapping*.
+
+        The rule must not be in a loaded grammar.
+        """
+        CommandRule.__init__(self, self.name, mapping, self._all_extras,
+                             self._defaults, self._exported, self._context,
+                             self._select)
+
+    def split_dictation(self):
+        """Return CommandRules over the specs of this rule that take no
+        dictation, named like it, and over those that do, named "*name*
+        dictation"; either is None if there is no such spec.
+
+        A dictation swallows the words spoken after it, so lib.chaining
+        only lets the second rule end a chain. Both rules are made once
+        and follow replace_action() and remap().
+        """
+        if self._split is None:
+            split = []
+            for dictation, name in ((False, self.name),
+                                    (True, "%s dictation" % self.name)):
+                rule = CommandRule(
+                    name=name, mapping=self._mapping,
+                    extras=self._all_extras, defaults=self._defaults,
+                    exported=False, context=self._context,
+                    select=lambda spec, dictation=dictation: takes_dictation(
+                        spec, self._all_extras) == dictation)
+                split.append(rule if rule.element is not None else None)
+            self._split = tuple(split)
+        return self._split
+
+    def spec_of(self, node):
+        """Return the spec recognized in *node*, a node of this rule."""
+        return node.children[0].children[0].actor._spec
+
+    def value(self, node):
+        start = timing.clock()
+        value = MappingRule.value(self, node)
+        timing.record(self.name, self.spec_of(node), "build",
+                      timing.clock() - start)
+        return value
+
+
+def split_rules(name, mapping, rare):
+    """Return CommandRules for the specs of *mapping* not in *rare*, named
+    *name*, and for those in *rare*, named "*name* rare".
+
+    The rare rule has no element if *rare* is empty.
+    """
+    return (CommandRule(name=name, mapping=mapping, exported=False,
+                        select=lambda spec: spec not in rare),
+            CommandRule(name="%s rare" % name, mapping=mapping,
+                        exported=False, select=lambda spec: spec in rare))
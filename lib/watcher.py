@@ -0,0 +1,215 @@
+"""Change notifications for the files of a directory, from the OS.
+
+A DirectoryWatcher runs a thread that blocks on the operating system's
+change notifications (ReadDirectoryChangesW on Windows, through pywin32,
+and inotify on Linux) and calls back with the name of every file written,
+created or renamed into the directory. Nothing polls: the thread sleeps
+until the OS reports a change.
+
+    watcher = DirectoryWatcher("grammars", changed)
+    watcher.start()
+
+A *recursive* watcher also reports the files of the subdirectories, by
+their path relative to the directory; hidden subdirectories (".git") are
+left out on Linux.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+
+
+class _Inotify(object):
+    """inotify watch of a directory, through libc."""
+
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_ISDIR = 0x40000000
+
+    _event = struct.Struct("iIII")
+
+    def __init__(self, directory, recursive=False):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"),
+                                 use_errno=True)
+        self._fd = self._libc.inotify_init()
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init failed")
+        self._directory = directory
+        self._recursive = recursive
+        # Path relative to the directory of each watch descriptor.
+        self._watches = {}
+        try:
+            self._add_watch("")
+            if recursive:
+                for path, names, _ in os.walk(directory):
+                    names[:] = [name for name in names
+                                if not name.startswith(".")]
+                    for name in names:
+                        self._add_watch(os.path.relpath(
+                            os.path.join(path, name), directory))
+        except OSError:
+            os.close(self._fd)
+            raise
+        # Written to by wake() to interrupt select().
+        self._wake_read, self._wake_write = os.pipe()
+
+    def _add_watch(self, relative):
+        mask = self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+        path = os.path.join(self._directory, relative)
+        wd = self._libc.inotify_add_watch(
+            self._fd, path.encode(sys.getfilesystemencoding()), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), "cannot watch %s" % path)
+        self._watches[wd] = relative
+
+    def wait(self):
+        """Block until files change; return their names, or None once
+        wake() was called."""
+        ready, _, _ = select.select([self._fd, self._wake_read], [], [])
+        if self._wake_read in ready:
+            return None
+        data = os.read(self._fd, 4096)
+        names = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self._event.unpack_from(data, offset)
+            offset += self._event.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if not name or wd not in self._watches:
+                continue
+            name = os.path.join(self._watches[wd],
+                                name.decode(sys.getfilesystemencoding()))
+            if not mask & self.IN_ISDIR:
+                names.append(name)
+            elif self._recursive and not os.path.basename(
+                    name).startswith("."):
+                try:
+                    self._add_watch(name)
+                except OSError:
+                    pass
+        return names
+
+    def wake(self):
+        os.write(self._wake_write, b"x")
+
+    def close(self):
+        for fd in (self._fd, self._wake_read, self._wake_write):
+            os.close(fd)
+
+
+class _ReadDirectoryChanges(object):
+    """ReadDirectoryChangesW watch of a directory, through pywin32."""
+
+    FILE_LIST_DIRECTORY = 0x0001
+    FILE_ACTION_REMOVED = 2
+
+    def __init__(self, directory, recursive=False):
+        import pywintypes
+        import win32con
+        import win32event
+        import win32file
+        self._win32event = win32event
+        self._win32file = win32file
+        self._handle = win32file.CreateFile(
+            directory, self.FILE_LIST_DIRECTORY,
+            win32con.FILE_SHARE_READ | win32con.FILE_SHARE_WRITE
+            | win32con.FILE_SHARE_DELETE,
+            None, win32con.OPEN_EXISTING,
+            win32con.FILE_FLAG_BACKUP_SEMANTICS
+            | win32con.FILE_FLAG_OVERLAPPED,
+            None)
+        self._overlapped = pywintypes.OVERLAPPED()
+        self._overlapped.hEvent = win32event.CreateEvent(None, True, False,
+                                                         None)
+        self._stop = win32event.CreateEvent(None, True, False, None)
+        self._buffer = win32file.AllocateReadBuffer(8192)
+        self._recursive = recursive
+        self._flags = (win32con.FILE_NOTIFY_CHANGE_FILE_NAME
+                       | win32con.FILE_NOTIFY_CHANGE_LAST_WRITE)
+
+    def wait(self):
+        """Block until files change; return their names, or None once
+        wake() was called."""
+        win32event, win32file = self._win32event, self._win32file
+        win32file.ReadDirectoryChangesW(self._handle, self._buffer,
+                                        self._recursive, self._flags,
+                                        self._overlapped)
+        result = win32event.WaitForMultipleObjects(
+            [self._overlapped.hEvent, self._stop], False,
+            win32event.INFINITE)
+        if result != win32event.WAIT_OBJECT_0:
+            return None
+        size = win32file.GetOverlappedResult(self._handle, self._overlapped,
+                                             True)
+        return [name for action, name
+                in win32file.FILE_NOTIFY_INFORMATION(self._buffer, size)
+                if action != self.FILE_ACTION_REMOVED]
+
+    def wake(self):
+        self._win32event.SetEvent(self._stop)
+
+    def close(self):
+        self._handle.Close()
+
+
+class DirectoryWatcher(object):
+    """Call *callback* with the name of each file changed in *directory*,
+    and in its subdirectories if *recursive*.
+
+    The callback runs on the watcher's thread.
+    """
+
+    _log = logging.getLogger("watcher")
+
+    def __init__(self, directory, callback, recursive=False):
+        self.directory = directory
+        self._callback = callback
+        self._recursive = recursive
+        self._backend = None
+        self._thread = None
+
+    def start(self):
+        """Start watching; raise OSError or ImportError if the OS
+        notifications are not available."""
+        if self._thread is not None:
+            return
+        if os.name == "nt":
+            self._backend = _ReadDirectoryChanges(self.directory,
+                                                  self._recursive)
+        elif sys.platform.startswith("linux"):
+            self._backend = _Inotify(self.directory, self._recursive)
+        else:
+            raise OSError("no change notifications on %s" % sys.platform)
+        self._thread = threading.Thread(target=self._run,
+                                        name="directory watcher")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._backend.wake()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        try:
+            while True:
+                names = self._backend.wait()
+                if names is None:
+                    break
+                for name in names:
+                    try:
+                        self._callback(name)
+                    except Exception as e:
+                        self._log.exception("Change callback for %s"
+                                            " failed: %s", name, e)
+        finally:
+            self._backend.close()